@@ -3,6 +3,8 @@
 
 import shlex
 import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 class EeschemaException(Exception):
     pass
@@ -23,18 +25,39 @@ def getField(component, field):
     return None
 
 def readEeschemaLine(file):
-    line = ""
-    quotationOpen = False
-    while True:
-        c = file.read(1)
-        if c is None:
+    """
+    Read a line from the file. A newline inside a quoted string doesn't end the
+    line.
+    """
+    line = file.readline()
+    if not line:
+        raise EeschemaException("Cannot parse EEschema, line expected, got EOF")
+    if line.count('"') % 2 == 0:
+        return line.strip()
+    # The line contains a quoted newline, read until the quotation is closed
+    parts = [line]
+    quotes = line.count('"')
+    while quotes % 2 == 1:
+        line = file.readline()
+        if not line:
             raise EeschemaException("Cannot parse EEschema, line expected, got EOF")
-        if c == '"':
-            quotationOpen = not quotationOpen
-        if c == '\n' and not quotationOpen:
-            break
-        line += c
-    return line.strip()
+        parts.append(line)
+        quotes += line.count('"')
+    return "".join(parts).strip()
+
+# Lines consisting only of plain words and simple double-quoted strings
+# separated by whitespace. Other lines (escapes, single quotes, words glued to
+# strings) are split by shlex.
+_SIMPLE_LINE = re.compile(r'[ \t\r\n]*(?:(?:"[^"\\]*"|[^ \t\r\n"\'\\]+)(?:[ \t\r\n]+|$))*')
+_SIMPLE_TOKEN = re.compile(r'"([^"]*)"|([^ \t\r\n"]+)')
+
+def splitLine(line):
+    """
+    Split the line into tokens the same way as shlex.split
+    """
+    if _SIMPLE_LINE.fullmatch(line) is None:
+        return shlex.split(line)
+    return [plain or quoted for quoted, plain in _SIMPLE_TOKEN.findall(line)]
 
 def readHeader(file):
     VERSION_STRING = "EESchema Schematic File Version"
@@ -54,26 +77,26 @@ def readHeader(file):
         elif line.startswith(DESCR_STRING):
             header["size"] = line[len(DESCR_STRING):].split()
         elif line.startswith("Sheet"):
-            items = shlex.split(line)
+            items = splitLine(line)
             header["sheet"] = (int(items[1]), int(items[2]))
         elif line.startswith("Title"):
-            header["title"] = shlex.split(line)[1]
+            header["title"] = splitLine(line)[1]
         elif line.startswith("Date"):
-            header["date"] = shlex.split(line)[1]
+            header["date"] = splitLine(line)[1]
         elif line.startswith("Comp"):
-            header["company"] = shlex.split(line)[1]
+            header["company"] = splitLine(line)[1]
         elif line.startswith("Rev"):
-            header["revision"] = shlex.split(line)[1]
+            header["revision"] = splitLine(line)[1]
         elif line.startswith("Comment1"):
-            header["comment1"] = shlex.split(line)[1]
+            header["comment1"] = splitLine(line)[1]
         elif line.startswith("Comment2"):
-            header["comment2"] = shlex.split(line)[1]
+            header["comment2"] = splitLine(line)[1]
         elif line.startswith("Comment3"):
-            header["comment3"] = shlex.split(line)[1]
+            header["comment3"] = splitLine(line)[1]
         elif line.startswith("Comment4"):
-            header["comment4"] = shlex.split(line)[1]
+            header["comment4"] = splitLine(line)[1]
         elif line.startswith("encoding"):
-            header["encoding"] = shlex.split(line)[1]
+            header["encoding"] = splitLine(line)[1]
         else:
             raise EeschemaException(f"Unexpected line: '{line}'")
 
@@ -85,18 +108,18 @@ def readComponent(file, sheetPath=""):
             return component
 
         if line.startswith("L"):
-            items = shlex.split(line)
+            items = splitLine(line)
             component["reference"] = items[2]
             component["name"] = items[1]
         elif line.startswith("U"):
-            items = shlex.split(line)
+            items = splitLine(line)
             component["u"] = items[3]
             component["unit"] = int(items[1])
         elif line.startswith("P"):
-            items = shlex.split(line)
+            items = splitLine(line)
             component["position"] = (int(items[1]), int(items[2]))
         elif line.startswith("F"):
-            items = shlex.split(line)
+            items = splitLine(line)
             field = {
                 "number": int(items[1]),
                 "text": items[2],
@@ -109,11 +132,11 @@ def readComponent(file, sheetPath=""):
             }
             if field["number"] >= 4:
                 field["name"] = items[10]
-            component["fields"] = component.get("fields", []) + [field]
+            component.setdefault("fields", []).append(field)
         elif line.startswith("AR"):
             # Hierarchical sheet reference. We assume all sheets are used within
             # the project, therefore we do not check validity of path
-            items = shlex.split(line)
+            items = splitLine(line)
             path = None
             ref = None
             for item in items:
@@ -129,7 +152,7 @@ def readComponent(file, sheetPath=""):
                 if path == compPath:
                     component["reference"] = ref
         else:
-            items = shlex.split(line)
+            items = splitLine(line)
             try:
                 int(items[0])
                 if len(items) == 3 and items[0] == "1":
@@ -149,14 +172,15 @@ def readSheet(file):
         if line == "$EndSheet":
             return sheet
         if line.startswith("F1 "):
-            items = shlex.split(line)
+            items = splitLine(line)
             sheet["f1"] = items[1]
         elif line.startswith("U "):
-            sheet["u"] = shlex.split(line)[1]
+            sheet["u"] = splitLine(line)[1]
 
-def extractComponents(filename, path=""):
+def readSchematicFile(filename, path=""):
     """
-    Extract all components from the schematics
+    Read components and sheets of a single schematic file without descending
+    into the sheets. Return a tuple (components, sheets).
     """
     components = []
     sheets = []
@@ -171,12 +195,52 @@ def extractComponents(filename, path=""):
                 components.append(readComponent(file, path))
             if line.startswith("$Sheet"):
                 sheets.append(readSheet(file))
-    for s in sheets:
-        dirname = os.path.dirname(filename)
-        sheetfilename = os.path.join(dirname, s["f1"])
-        components += extractComponents(sheetfilename, path + "/" + s["u"])
+    return components, sheets
+
+def sheetInstances(filename, path, sheets):
+    """
+    Return a list of (filename, path) of the given sheets read from filename
+    """
+    dirname = os.path.dirname(filename)
+    return [(os.path.join(dirname, s["f1"]), path + "/" + s["u"]) for s in sheets]
+
+def extractComponents(filename, path="", workers=1):
+    """
+    Extract all components from the schematics. With workers > 1, every sheet
+    instance is read in a process pool as soon as its parent sheet is read;
+    the components are assembled in the hierarchy order afterwards.
+    """
+    if workers > 1:
+        return _extractComponentsParallel(filename, path, workers)
+    components, sheets = readSchematicFile(filename, path)
+    for sheetfilename, sheetPath in sheetInstances(filename, path, sheets):
+        components += extractComponents(sheetfilename, sheetPath)
     return components
 
+def _extractComponentsParallel(filename, path, workers):
+    # The components depend on the sheet path (hierarchical references), so we
+    # read each sheet instance. Sheets are submitted once their parent is read.
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(readSchematicFile, filename, path): (filename, path)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sheetfilename, sheetPath = pending.pop(future)
+                components, sheets = future.result()
+                children = sheetInstances(sheetfilename, sheetPath, sheets)
+                results[sheetPath] = (components, children)
+                for child in children:
+                    pending[executor.submit(readSchematicFile, *child)] = child
+
+    def assemble(sheetPath):
+        components, children = results[sheetPath]
+        components = list(components)
+        for _, childPath in children:
+            components += assemble(childPath)
+        return components
+    return assemble(path)
+
 def getUnit(component):
     return component["unit"]
 
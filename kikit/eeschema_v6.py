@@ -1,9 +1,10 @@
-from dataclasses import dataclass, field
-from kikit.sexpr import Atom, parseSexprF
+from collections import ChainMap
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from kikit.sexpr import Atom, LazySExpr, SExpr, parseSexprF
 from itertools import islice
 import os
-from typing import Optional
-from copy import deepcopy
+from typing import Dict, MutableMapping, Optional, Tuple
 
 class SchematicError(RuntimeError):
     pass
@@ -16,7 +17,7 @@ class Symbol:
     lib_id: Optional[str] = None
     in_bom: Optional[bool] = None
     on_board: Optional[bool] = None
-    properties: dict = field(default_factory=dict)
+    properties: MutableMapping[str, str] = field(default_factory=dict)
 
 @dataclass
 class SymbolInstance:
@@ -36,34 +37,19 @@ def getProperty(sexpr, field):
     return None
 
 def isSymbol(sexpr):
-    if isinstance(sexpr, Atom) or len(sexpr) == 0:
-        return False
-    item = sexpr[0]
-    return isinstance(item, Atom) and item.value == "symbol"
+    return isinstance(sexpr, SExpr) and sexpr.name == "symbol"
 
 def isSymbolInstances(sexpr):
-    if isinstance(sexpr, Atom) or len(sexpr) == 0:
-        return False
-    item = sexpr[0]
-    return isinstance(item, Atom) and item.value == "symbol_instances"
+    return isinstance(sexpr, SExpr) and sexpr.name == "symbol_instances"
 
 def isSheet(sexpr):
-    if isinstance(sexpr, Atom) or len(sexpr) == 0:
-        return False
-    item = sexpr[0]
-    return isinstance(item, Atom) and item.value == "sheet"
+    return isinstance(sexpr, SExpr) and sexpr.name == "sheet"
 
 def isUuid(sexpr):
-    if isinstance(sexpr, Atom) or len(sexpr) == 0:
-        return False
-    item = sexpr[0]
-    return isinstance(item, Atom) and item.value == "uuid"
+    return isinstance(sexpr, SExpr) and sexpr.name == "uuid"
 
 def isPath(sexpr):
-    if isinstance(sexpr, Atom) or len(sexpr) == 0:
-        return False
-    item = sexpr[0]
-    return isinstance(item, Atom) and item.value == "path"
+    return isinstance(sexpr, SExpr) and sexpr.name == "path"
 
 def getUuid(sexpr):
     for x in islice(sexpr, 1, None):
@@ -162,14 +148,84 @@ def extractSymbolInstanceV6(sexpr, path):
             s.footprint = x[1].value
     return s
 
-def collectSymbols(filename, path = None):
+# Parsed sheets keyed by absolute path and modification time
+SheetCache = Dict[Tuple[str, float], SExpr]
+
+def readSheet(filename, cache: Optional[SheetCache] = None) -> SExpr:
+    """
+    Parse given sheet. When a cache is given, a sheet is parsed only once even
+    if it is instantiated multiple times in the hierarchy.
+    """
+    key = (os.path.abspath(filename), os.path.getmtime(filename))
+    if cache is not None and key in cache:
+        return cache[key]
+    # Only symbols, sheets and few other top-level nodes are needed, so don't
+    # parse wires, junctions, library symbols, etc.
+    with open(filename, encoding="utf-8") as f:
+        sheetSExpr = parseSexprF(f, lazy=True)
+    if cache is not None:
+        cache[key] = sheetSExpr
+    return sheetSExpr
+
+def getSheetFilename(sexpr, filename):
+    """
+    Given a sheet node from the file filename, return the filename of the sheet
+    """
+    f = getProperty(sexpr, "Sheet file")
+    if f is None:
+        # v7 format
+        f = getProperty(sexpr, "Sheetfile")
+    if f is None:
+        raise SchematicError("Invalid format - no Sheet file")
+    dirname = os.path.dirname(filename)
+    if len(dirname) > 0:
+        f = dirname + "/" + f
+    return f
+
+# Top-level nodes of a sheet used by collectSymbols
+HIERARCHY_NODES = {"uuid", "symbol", "sheet", "symbol_instances"}
+
+def _readHierarchyNodes(filename) -> SExpr:
+    sheet = readSheet(filename)
+    return SExpr([x.materialize() for x in sheet.items
+        if isinstance(x, LazySExpr) and x.name in HIERARCHY_NODES])
+
+def loadSheets(filename, workers: int) -> SheetCache:
+    """
+    Parse given sheet and all its sub-sheets in a pool of given number of
+    processes. Return a sheet cache for collectSymbols. Each sheet file is
+    parsed once; the sub-sheets are submitted as soon as their parent is read.
+    """
+    cache = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_readHierarchyNodes, filename): filename}
+        seen = {os.path.abspath(filename)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sheetFilename = pending.pop(future)
+                sheet = future.result()
+                key = (os.path.abspath(sheetFilename), os.path.getmtime(sheetFilename))
+                cache[key] = sheet
+                for item in sheet.items:
+                    if not isSheet(item):
+                        continue
+                    f = getSheetFilename(item, sheetFilename)
+                    if os.path.abspath(f) in seen:
+                        continue
+                    seen.add(os.path.abspath(f))
+                    pending[executor.submit(_readHierarchyNodes, f)] = f
+    return cache
+
+def collectSymbols(filename, path = None, cache: Optional[SheetCache] = None):
     """
     Crawl given sheet and return two lists - one with symbols, one with
     symbol instances
     """
     isRoot = path is None
-    with open(filename, encoding="utf-8") as f:
-        sheetSExpr = parseSexprF(f)
+    if cache is None:
+        cache = {}
+    sheetSExpr = readSheet(filename, cache)
     symbols, instances = [], []
     for item in sheetSExpr.items:
         if isUuid(item) and path is None:
@@ -181,17 +237,9 @@ def collectSymbols(filename, path = None):
                 instances.append(instance)
             continue
         if isSheet(item):
-            f = getProperty(item, "Sheet file")
-            if f is None:
-                # v7 format
-                f = getProperty(item, "Sheetfile")
-            if f is None:
-                raise SchematicError("Invalid format - no Sheet file")
+            f = getSheetFilename(item, filename)
             uuid = getUuid(item)
-            dirname = os.path.dirname(filename)
-            if len(dirname) > 0:
-                f = dirname + "/" + f
-            s, i = collectSymbols(f, path + "/" + uuid)
+            s, i = collectSymbols(f, path + "/" + uuid, cache)
             symbols += s
             instances += i
             continue
@@ -213,16 +261,25 @@ def getUnit(component):
 def getReference(component):
     return component.properties["Reference"]
 
-def extractComponents(filename):
-    symbols, instances = collectSymbols(filename)
+def extractComponents(filename, workers: int = 1):
+    """
+    Extract components from the schematic and its sub-sheets. With workers > 1,
+    only parsing of the sheet files runs in a process pool, each file once.
+    The symbols and instances are then collected serially from the parsed
+    sheets.
+    """
+    cache = loadSheets(filename, workers) if workers > 1 else None
+    symbols, instances = collectSymbols(filename, cache=cache)
     symbolsDict = {x.path: x for x in symbols}
 
     assert len(symbols) == len(instances)
 
     components = []
     for inst in instances:
-        s = deepcopy(symbolsDict[inst.symbol_path])
-        # Note that s should be unique, so we can safely modify it
+        # The instance overrides are layered over the symbol properties, so
+        # the symbol doesn't have to be copied
+        s = replace(symbolsDict[inst.symbol_path])
+        s.properties = ChainMap({}, s.properties)
         if inst.reference is not None:
             s.properties["Reference"] = inst.reference
         if inst.value is not None:
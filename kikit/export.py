@@ -1,6 +1,7 @@
 # Based on https://github.com/KiCad/kicad-source-mirror/blob/master/demos/python_scripts_examples/gen_gerber_and_drill_files_board.py
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pcbnewTransition import pcbnew
 from pcbnewTransition.pcbnew import *
 
@@ -67,21 +68,22 @@ def setExcludeEdgeLayer(plotOptions, excludeEdge):
         else:
             plotOptions.SetLayerSelection(LSET(Layer.Edge_Cuts))
 
-def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True, settings=exportSettingsJlcpcb):
+def gerberPlotLayers(board, plot_plan=fullGerberPlotPlan, settings=exportSettingsJlcpcb):
     """
-    Export board to gerbers.
-
-    If no output dir is specified, use '<board file>-gerber'
+    Return a list of (suffix, layer, comment) of all layers to plot, i.e., the
+    plot plan followed by the inner copper layers of the board, if any.
     """
-    basename = os.path.basename(boardfile)
-    if outputdir:
-        plotDir = outputdir
-    else:
-        plotDir = basename + "-gerber"
-    plotDir = os.path.abspath(plotDir)
-
-    board = LoadBoard(boardfile)
+    layers = [("" if settings["NoSuffix"] else name, id, comment)
+        for name, id, comment in plot_plan]
+    if hasCopper(plot_plan):
+        #generate internal copper layers, if any
+        lyrcnt = board.GetCopperLayerCount()
+        for innerlyr in range (1, lyrcnt - 1):
+            lyrname = "" if settings["NoSuffix"] else 'inner{}'.format(innerlyr)
+            layers.append((lyrname, innerlyr, "inner"))
+    return layers
 
+def createGerberPlotController(board, plotDir, settings=exportSettingsJlcpcb):
     pctl = PLOT_CONTROLLER(board)
     popt = pctl.GetPlotOptions()
 
@@ -105,71 +107,126 @@ def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True
     popt.SetSubtractMaskFromSilk(False)
     popt.SetDrillMarksType(pcbnew.DRILL_MARKS_NO_DRILL_SHAPE)
     popt.SetSkipPlotNPTH_Pads(False)
+    return pctl
 
-    # prepare the gerber job file
-    jobfile_writer = GERBER_JOBFILE_WRITER(board)
-
-    for name, id, comment in plot_plan:
+def plotGerberLayers(pctl, layers):
+    """
+    Plot given layers (see gerberPlotLayers) and return a list of (layer,
+    plot file name) for the job file.
+    """
+    popt = pctl.GetPlotOptions()
+    files = []
+    for suffix, id, comment in layers:
         if id <= B_Cu:
             popt.SetSkipPlotNPTH_Pads(True)
         else:
             popt.SetSkipPlotNPTH_Pads(False)
 
         pctl.SetLayer(id)
-        suffix = "" if settings["NoSuffix"] else name
         pctl.OpenPlotfile(suffix, PLOT_FORMAT_GERBER, comment)
-        jobfile_writer.AddGbrFile(id, os.path.basename(pctl.GetPlotFileName()))
+        files.append((id, os.path.basename(pctl.GetPlotFileName())))
         if pctl.PlotLayer() == False:
             print("plot error")
 
-    if hasCopper(plot_plan):
-        #generate internal copper layers, if any
-        lyrcnt = board.GetCopperLayerCount()
-        for innerlyr in range (1, lyrcnt - 1):
-            popt.SetSkipPlotNPTH_Pads(True)
-            pctl.SetLayer(innerlyr)
-            lyrname = "" if settings["NoSuffix"] else 'inner{}'.format(innerlyr)
-            pctl.OpenPlotfile(lyrname, PLOT_FORMAT_GERBER, "inner")
-            jobfile_writer.AddGbrFile(innerlyr, os.path.basename(pctl.GetPlotFileName()))
-            if pctl.PlotLayer() == False:
-                print("plot error")
-
     # At the end you have to close the last plot, otherwise you don't know when
     # the object will be recycled!
     pctl.ClosePlot()
+    return files
 
-    if drilling:
-        # Fabricators need drill files.
-        # sometimes a drill map file is asked (for verification purpose)
-        drlwriter = EXCELLON_WRITER(board)
-        drlwriter.SetMapFileFormat(PLOT_FORMAT_PDF)
+def _plotGerberLayersInProcess(boardfile, plotDir, layers, settings):
+    board = LoadBoard(boardfile)
+    pctl = createGerberPlotController(board, plotDir, settings)
+    return plotGerberLayers(pctl, layers)
 
-        mirror = False
-        minimalHeader = settings["MinimalHeader"]
-        if settings["UseAuxOrigin"]:
-            offset = board.GetDesignSettings().GetAuxOrigin()
-        else:
-            offset = VECTOR2I(0, 0)
-
-        # False to generate 2 separate drill files (one for plated holes, one for non plated holes)
-        # True to generate only one drill file
-        mergeNPTH = settings["MergeNPTH"]
-        drlwriter.SetOptions(mirror, minimalHeader, offset, mergeNPTH)
-        drlwriter.SetRouteModeForOvalHoles(False)
-
-        metricFmt = True
-        zerosFmt = settings["ZerosFormat"]
-        drlwriter.SetFormat(metricFmt, zerosFmt)
-        genDrl = True
-        genMap = True
-        drlwriter.CreateDrillandMapFilesSet(pctl.GetPlotDirName(), genDrl, genMap)
-
-        # One can create a text file to report drill statistics
-        rptfn = pctl.GetPlotDirName() + 'drill_report.rpt'
-        drlwriter.GenDrillReportFile(rptfn)
-
-    job_fn=os.path.dirname(pctl.GetPlotFileName()) + '/' + os.path.basename(boardfile)
-    job_fn=os.path.splitext(job_fn)[0] + '.gbrjob'
+def plotGerberLayersParallel(boardfile, plotDir, layers, settings, workers,
+                             concurrently=None):
+    """
+    Plot given layers in a pool of given number of processes, each of them
+    loads the board and plots a subset of the layers. While they run, the
+    function concurrently (if specified) is called. Return the same list as
+    plotGerberLayers.
+    """
+    workers = min(workers, len(layers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_plotGerberLayersInProcess, boardfile,
+                                   plotDir, layers[i::workers], settings)
+                   for i in range(workers)]
+        if concurrently is not None:
+            concurrently()
+        files = [None] * len(layers)
+        for i, future in enumerate(futures):
+            files[i::workers] = future.result()
+    return files
+
+def createDrillFiles(board, plotDir, settings=exportSettingsJlcpcb):
+    # Fabricators need drill files.
+    # sometimes a drill map file is asked (for verification purpose)
+    drlwriter = EXCELLON_WRITER(board)
+    drlwriter.SetMapFileFormat(PLOT_FORMAT_PDF)
+
+    mirror = False
+    minimalHeader = settings["MinimalHeader"]
+    if settings["UseAuxOrigin"]:
+        offset = board.GetDesignSettings().GetAuxOrigin()
+    else:
+        offset = VECTOR2I(0, 0)
+
+    # False to generate 2 separate drill files (one for plated holes, one for non plated holes)
+    # True to generate only one drill file
+    mergeNPTH = settings["MergeNPTH"]
+    drlwriter.SetOptions(mirror, minimalHeader, offset, mergeNPTH)
+    drlwriter.SetRouteModeForOvalHoles(False)
+
+    metricFmt = True
+    zerosFmt = settings["ZerosFormat"]
+    drlwriter.SetFormat(metricFmt, zerosFmt)
+    genDrl = True
+    genMap = True
+    drlwriter.CreateDrillandMapFilesSet(os.path.join(plotDir, ""), genDrl, genMap)
+
+    # One can create a text file to report drill statistics
+    rptfn = os.path.join(plotDir, 'drill_report.rpt')
+    drlwriter.GenDrillReportFile(rptfn)
+
+def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True,
+               settings=exportSettingsJlcpcb, workers=1):
+    """
+    Export board to gerbers.
+
+    If no output dir is specified, use '<board file>-gerber'
+
+    With workers > 1, the layers are split among worker processes that each
+    load the board. The drill files and the job file are written by this
+    process, the drill files while the workers plot.
+    """
+    basename = os.path.basename(boardfile)
+    if outputdir:
+        plotDir = outputdir
+    else:
+        plotDir = basename + "-gerber"
+    plotDir = os.path.abspath(plotDir)
+
+    os.makedirs(plotDir, exist_ok=True)
+
+    board = LoadBoard(boardfile)
+    layers = gerberPlotLayers(board, plot_plan, settings)
+
+    drill = lambda: createDrillFiles(board, plotDir, settings)
+    if workers > 1 and len(layers) > 1:
+        files = plotGerberLayersParallel(boardfile, plotDir, layers, settings,
+            workers, concurrently=drill if drilling else None)
+    else:
+        pctl = createGerberPlotController(board, plotDir, settings)
+        files = plotGerberLayers(pctl, layers)
+        if drilling:
+            drill()
+
+    # prepare the gerber job file
+    jobfile_writer = GERBER_JOBFILE_WRITER(board)
+    for id, filename in files:
+        jobfile_writer.AddGbrFile(id, filename)
+    job_fn = os.path.join(plotDir, os.path.basename(boardfile))
+    job_fn = os.path.splitext(job_fn)[0] + '.gbrjob'
     jobfile_writer.CreateJobFile(job_fn)
 
 def pasteDxfExport(board, plotDir):
@@ -10,12 +10,14 @@ def export():
 @click.command()
 @click.argument("boardfile", type=click.Path(dir_okay=False))
 @click.argument("outputdir", type=click.Path(file_okay=False), default=None)
-def gerber(boardfile, outputdir):
+@click.option("--workers", type=click.IntRange(min=1), default=1,
+    help="Number of processes used to plot the layers")
+def gerber(boardfile, outputdir, workers):
     from kikit.export import gerberImpl
     from kikit.common import fakeKiCADGui
     app = fakeKiCADGui()
 
-    gerberImpl(boardfile, outputdir)
+    gerberImpl(boardfile, outputdir, workers=workers)
 
 @click.command()
 @click.argument("boardfile", type=click.Path(dir_okay=False))
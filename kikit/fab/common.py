@@ -17,12 +17,13 @@ if isV6() or isV7():
 from kikit import eeschema #import getField, getUnit, getReference
 
 # A user can still supply v5 schematics even when we run v6, therefore,
-# we have to load the correct schematics and provide the right getters
-def extractComponents(filename):
+# we have to load the correct schematics and provide the right getters.
+# The workers are passed to the schematic reader of given version.
+def extractComponents(filename, workers=1):
     if filename.endswith(".kicad_sch"):
-        return eeschema_v6.extractComponents(filename)
+        return eeschema_v6.extractComponents(filename, workers=workers)
     if filename.endswith(".sch"):
-        return eeschema.extractComponents(filename)
+        return eeschema.extractComponents(filename, workers=workers)
     raise RuntimeError(f"Unknown schematic file type specified: {filename}")
 
 def getUnit(component):
@@ -143,10 +144,60 @@ def applyCorrectionPattern(correctionPatterns, footprint):
     # GetUniStringLibId returns the full footprint name including the
     # library in the form of "Resistor_SMD:R_0402_1005Metric"
     footprintName = str(footprint.GetFPID().GetUniStringLibId())
-    for corpat in correctionPatterns:
-        if corpat.footprint.match(footprintName):
-            return (corpat.x_correction, corpat.y_correction, corpat.rotation)
-    return (0, 0, 0)
+    return CorrectionMatcher(correctionPatterns).match(footprintName)
+
+class CorrectionMatcher:
+    """
+    Matches footprint names against correction patterns; the first matching
+    pattern applies. The patterns are combined into a single regular
+    expression and the corrections are cached per footprint name.
+    """
+    def __init__(self, correctionPatterns):
+        self.patterns = correctionPatterns
+        self.combined = self._combine(correctionPatterns)
+        self.cache = {}
+
+    @staticmethod
+    def _combine(correctionPatterns):
+        # Each alternative is followed by an empty group, so the index of the
+        # last group identifies the matched pattern. Patterns with their own
+        # groups or flags are matched one by one.
+        if len(correctionPatterns) == 0:
+            return None
+        defaultFlags = re.compile("").flags
+        if any(p.footprint.groups > 0 or p.footprint.flags != defaultFlags
+               for p in correctionPatterns):
+            return None
+        try:
+            return re.compile("|".join(f"(?:{p.footprint.pattern})()"
+                for p in correctionPatterns))
+        except re.error:
+            return None
+
+    def _findPattern(self, footprintName):
+        if len(self.patterns) == 0:
+            return None
+        if self.combined is not None:
+            match = self.combined.match(footprintName)
+            return None if match is None else self.patterns[match.lastindex - 1]
+        for corpat in self.patterns:
+            if corpat.footprint.match(footprintName):
+                return corpat
+        return None
+
+    def match(self, footprintName):
+        """
+        Return correction (x, y, rotation) for given footprint name
+        """
+        correction = self.cache.get(footprintName)
+        if correction is None:
+            corpat = self._findPattern(footprintName)
+            if corpat is None:
+                correction = (0, 0, 0)
+            else:
+                correction = (corpat.x_correction, corpat.y_correction, corpat.rotation)
+            self.cache[footprintName] = correction
+        return correction
 
 def collectPosData(board, correctionFields, posFilter=lambda x : True,
                    footprintX=defaultFootprintX, footprintY=defaultFootprintY, bom=None,
@@ -168,35 +219,39 @@ def collectPosData(board, correctionFields, posFilter=lambda x : True,
     correctionPatterns = []
     if correctionFile is not None:
         correctionPatterns = readCorrectionPatterns(correctionFile)
+    correctionMatcher = CorrectionMatcher(correctionPatterns)
 
-    footprints = []
-    placeOffset = board.GetDesignSettings().GetAuxOrigin()
-    for footprint in board.GetFootprints():
-        if excludeFromPos(footprint):
-            continue
-        if posFilter(footprint) and footprint.GetReference() in bom:
-            footprints.append(footprint)
-    def getCompensation(footprint):
-        if footprint.GetReference() not in bom:
-            return 0, 0, 0
+    def getCompensation(footprint, reference):
         field = None
         for fieldName in correctionFields:
-            field = getField(bom[footprint.GetReference()], fieldName)
+            field = getField(bom[reference], fieldName)
             if field is not None:
                 break
         if field is None or field == "":
-            return applyCorrectionPattern(
-                correctionPatterns,
-                footprint)
+            # GetUniStringLibId returns the full footprint name including the
+            # library in the form of "Resistor_SMD:R_0402_1005Metric"
+            return correctionMatcher.match(
+                str(footprint.GetFPID().GetUniStringLibId()))
         try:
             return parseCompensation(field)
         except FormatError as e:
-            raise FormatError(f"{footprint.GetReference()}: {e}")
-    return [(footprint.GetReference(),
-             footprintX(footprint, placeOffset, getCompensation(footprint)),
-             footprintY(footprint, placeOffset, getCompensation(footprint)),
+            raise FormatError(f"{reference}: {e}")
+
+    posData = []
+    placeOffset = board.GetDesignSettings().GetAuxOrigin()
+    for footprint in board.GetFootprints():
+        if excludeFromPos(footprint):
+            continue
+        reference = footprint.GetReference()
+        if not posFilter(footprint) or reference not in bom:
+            continue
+        compensation = getCompensation(footprint, reference)
+        posData.append((reference,
+             footprintX(footprint, placeOffset, compensation),
+             footprintY(footprint, placeOffset, compensation),
              layerToSide(footprint.GetLayer()),
-             footprintOrientation(footprint, getCompensation(footprint))) for footprint in footprints]
+             footprintOrientation(footprint, compensation)))
+    return posData
 
 def posDataToFile(posData, filename):
     with open(filename, "w", newline="", encoding="utf-8") as csvfile:
@@ -3,13 +3,17 @@ import typing
 from typing import Any, Dict, List, Optional, Union, Tuple, Callable, Iterable
 from kikit.typing import Box, T, ComparableT
 from itertools import islice, chain
+from bisect import bisect_left, bisect_right
 from math import isclose
 from copy import copy
+import numpy as np
 
 class Interval:
     """
     Basic interval representation
     """
+    __slots__ = ("min", "max")
+
     def __init__(self, a: float, b: float) -> None:
         self.min = min(a, b)
         self.max = max(a, b)
@@ -44,7 +48,8 @@ class Interval:
 
     def __eq__(self, other: object) -> bool:
         return isinstance(other, Interval) and \
-               isclose(self.min, other.min) and isclose(self.max, other.max)
+               (self.min == other.min or isclose(self.min, other.min)) and \
+               (self.max == other.max or isclose(self.max, other.max))
 
     def __repr__(self) -> str:
         return f"I({self.min}, {self.max})"
@@ -53,6 +58,8 @@ class Interval:
         return f"<{self.min}, {self.max}>"
 
 class IntervalList:
+    __slots__ = ("intervals",)
+
     def __init__(self, intervals: List[Interval]) -> None:
         self.intervals = self._normalize(self._toList(intervals))
 
@@ -192,20 +199,41 @@ class BoxNeighbors:
 
     @staticmethod
     def _computeQuery(list: List[Tuple[object, Interval, float]]) -> Dict[object, List[Tuple[object, IntervalList]]]:
-        neighbors = {}
-        for i, (ident, interval, pos) in enumerate(list):
-            n: List[Tuple[object, IntervalList]] = []
-            rest = IntervalList([interval])
-            for j in range(i + 1, len(list)):
-                nIdent, nInterval, nPos = list[j]
-                shadow = rest.intersect(nInterval)
-                if shadow.trivial():
+        """
+        Sweep the boxes from the farthest one and maintain a map of the
+        projection axis to the closest box swept so far. The map is a sorted
+        list of breakpoints; the segment starting at bounds[k] is covered by the
+        box list[owners[k]] or by no box (None). The neighbors of a box are the
+        owners of the segments within its projection.
+        """
+        bounds: List[float] = []
+        owners: List[Optional[int]] = []
+        neighbors: Dict[object, List[Tuple[object, IntervalList]]] = {}
+        for i in range(len(list) - 1, -1, -1):
+            ident, interval, _ = list[i]
+            if interval.trivial():
+                neighbors[ident] = []
+                continue
+            shadows: Dict[int, List[Interval]] = {}
+            start = max(bisect_right(bounds, interval.min) - 1, 0)
+            end = bisect_left(bounds, interval.max)
+            for k in range(start, end):
+                owner = owners[k]
+                if owner is None:
                     continue
-                n.append((nIdent, shadow))
-                rest = rest.difference(nInterval)
-                if rest.trivial():
-                    break
-            neighbors[ident] = n
+                a = max(bounds[k], interval.min)
+                b = min(bounds[k + 1], interval.max)
+                if a < b:
+                    shadows.setdefault(owner, []).append(Interval(a, b))
+            neighbors[ident] = [(list[j][0], IntervalList(shadows[j]))
+                                for j in sorted(shadows)]
+
+            # The segment after the projection keeps its owner
+            end = bisect_right(bounds, interval.max)
+            endOwner = owners[end - 1] if end > 0 else None
+            start = bisect_left(bounds, interval.min)
+            bounds[start:end] = [interval.min, interval.max]
+            owners[start:end] = [i, endOwner]
         return neighbors
 
     @staticmethod
@@ -241,6 +269,8 @@ class AxialLine(Interval):
     """
     Representation of a horizontal or vertical line
     """
+    __slots__ = ("x", "tag")
+
     def __init__(self, x: float, y1: float, y2: float, tag: Optional[Any]=None) -> None:
         super().__init__(y1, y2)
         self.x = x
@@ -259,7 +289,8 @@ class AxialLine(Interval):
 
     def __eq__(self, other: object) -> bool:
         return isinstance(other, AxialLine) and \
-               isclose(self.x, other.x) and super().__eq__(other)
+               (self.x == other.x or isclose(self.x, other.x)) and \
+               super().__eq__(other)
 
     def __repr__(self) -> str:
         return f"Line[{self.tag}]({self.x}, {self.min}, {self.max})"
@@ -272,6 +303,8 @@ class ShadowLine:
     Represents a horizontal or vertical line with a shadow (possible
     prolongation)
     """
+    __slots__ = ("line", "shadow")
+
     def __init__(self, line: AxialLine, shadow: Interval) -> None:
         assert isinstance(line, AxialLine)
         assert isinstance(shadow, Interval)
@@ -290,6 +323,99 @@ class ShadowLine:
     def __repr__(self) -> str:
         return f"Shadow({self.line.__repr__()}, {self.shadow.__repr__()})"
 
+class AxialLineSet:
+    """
+    Columnar representation of a collection of horizontal or vertical lines
+    for batch processing. The coordinates are stored in NumPy arrays, the tags
+    are stored as indices into the list tags (-1 stands for no tag).
+    """
+    __slots__ = ("x", "min", "max", "tagIdx", "tags")
+
+    def __init__(self, x: Any, a: Any, b: Any, tagIdx: Optional[Any]=None,
+                 tags: Optional[List[Any]]=None) -> None:
+        self.x = np.asarray(x, dtype=np.float64)
+        a = np.asarray(a, dtype=np.float64)
+        b = np.asarray(b, dtype=np.float64)
+        self.min = np.minimum(a, b)
+        self.max = np.maximum(a, b)
+        if tagIdx is None:
+            self.tagIdx = np.full(len(self.x), -1, dtype=np.int64)
+        else:
+            self.tagIdx = np.asarray(tagIdx, dtype=np.int64)
+        self.tags: List[Any] = [] if tags is None else tags
+
+    @staticmethod
+    def fromLines(lines: Iterable[AxialLine]) -> AxialLineSet:
+        lines = list(lines)
+        tags: List[Any] = []
+        tagMap: Dict[Any, int] = {}
+        tagIdx: List[int] = []
+        for l in lines:
+            if l.tag is None:
+                tagIdx.append(-1)
+                continue
+            if l.tag not in tagMap:
+                tagMap[l.tag] = len(tags)
+                tags.append(l.tag)
+            tagIdx.append(tagMap[l.tag])
+        return AxialLineSet([l.x for l in lines], [l.min for l in lines],
+                            [l.max for l in lines], tagIdx, tags)
+
+    @staticmethod
+    def concatenate(sets: Iterable[AxialLineSet]) -> AxialLineSet:
+        sets = list(sets)
+        tags: List[Any] = []
+        tagIdx = [np.empty(0, dtype=np.int64)]
+        for s in sets:
+            tagIdx.append(np.where(s.tagIdx >= 0, s.tagIdx + len(tags), -1))
+            tags.extend(s.tags)
+        return AxialLineSet(
+            np.concatenate([np.empty(0)] + [s.x for s in sets]),
+            np.concatenate([np.empty(0)] + [s.min for s in sets]),
+            np.concatenate([np.empty(0)] + [s.max for s in sets]),
+            np.concatenate(tagIdx), tags)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def tag(self, i: int) -> Any:
+        idx = self.tagIdx[i]
+        return None if idx < 0 else self.tags[idx]
+
+    def line(self, i: int) -> AxialLine:
+        return AxialLine(float(self.x[i]), float(self.min[i]), float(self.max[i]),
+                         self.tag(i))
+
+    def lines(self) -> List[AxialLine]:
+        return [self.line(i) for i in range(len(self))]
+
+    def select(self, indices: Any) -> AxialLineSet:
+        """
+        Return a new set consisting of the lines on given indices
+        """
+        return AxialLineSet(self.x[indices], self.min[indices],
+                            self.max[indices], self.tagIdx[indices], self.tags)
+
+    def withSpan(self, a: Any, b: Any) -> AxialLineSet:
+        """
+        Return a new set of lines with the same position and tags, but with the
+        span given by arrays a and b.
+        """
+        return AxialLineSet(self.x, a, b, self.tagIdx, self.tags)
+
+    def sortedByX(self) -> AxialLineSet:
+        return self.select(np.argsort(self.x, kind="stable"))
+
+    def unique(self) -> AxialLineSet:
+        """
+        Return a new set without duplicate lines
+        """
+        if len(self) == 0:
+            return self
+        rows = np.column_stack((self.x, self.min, self.max, self.tagIdx))
+        _, indices = np.unique(rows, axis=0, return_index=True)
+        return self.select(np.sort(indices))
+
 def collectBoxEdges(box: Box) -> Tuple[List[AxialLine], List[AxialLine]]:
     """
     Given a box, return a tuple (horiz edges, vert edges) as lists of AxialLine
@@ -299,29 +425,29 @@ def collectBoxEdges(box: Box) -> Tuple[List[AxialLine], List[AxialLine]]:
         [AxialLine(box[0], box[1], box[3]), AxialLine(box[2], box[1], box[3])]
     )
 
+def collectHardStopSets(boxes: Iterable[Box]) -> Tuple[AxialLineSet, AxialLineSet]:
+    """
+    Given an iterable of boxes, return all partition lines hard stops - i.e.,
+    union of all edges as a tuple (horiz edges, vert edges) as AxialLineSet
+    """
+    b = np.array(list(boxes), dtype=np.float64).reshape(-1, 4)
+    assert len(b) > 0
+    commonBox = np.concatenate((b[:, :2].min(axis=0), b[:, 2:].max(axis=0)))
+    b = np.vstack((b, commonBox))
+    hedges = AxialLineSet(np.concatenate((b[:, 1], b[:, 3])),
+                          np.tile(b[:, 0], 2), np.tile(b[:, 2], 2))
+    vedges = AxialLineSet(np.concatenate((b[:, 0], b[:, 2])),
+                          np.tile(b[:, 1], 2), np.tile(b[:, 3], 2))
+    return hedges.unique(), vedges.unique()
+
 def collectHardStops(boxes: Iterable[Box]) -> Tuple[List[AxialLine], List[AxialLine]]:
     """
     Given an iterable of boxes, return all partition lines hard stops - i.e.,
     union of all edges as a tuple (horiz edges, vert edges) as lists of
     AxialLine
     """
-    from kikit.common import shpBBoxMerge
-
-    hedges, vedges = set(), set()
-    commonBox: Optional[Box] = None
-    for b in boxes:
-        if commonBox is None:
-            commonBox = b
-        else:
-            commonBox = shpBBoxMerge(commonBox, b)
-        h, v = collectBoxEdges(b)
-        hedges.update(h)
-        vedges.update(v)
-    assert commonBox is not None
-    h, v = collectBoxEdges(commonBox)
-    hedges.update(h)
-    vedges.update(v)
-    return list(hedges), list(vedges)
+    hedges, vedges = collectHardStopSets(boxes)
+    return hedges.lines(), vedges.lines()
 
 def defaultSeedFilter(boxIdA: object, boxIdB: object, vertical: bool, seedline: AxialLine) -> bool:
     return True
@@ -400,6 +526,149 @@ def lowerBound(sortedCollection: List[T], item: ComparableT, key: Callable[[T],
             hi = mid
     return lo - 1
 
+class IndexSet:
+    """
+    Set of integers from range [0, size) answering the queries for the
+    closest element in logarithmic time. It is a complete binary tree
+    storing the number of elements in each subtree.
+    """
+    def __init__(self, size: int) -> None:
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.counts = [0] * (2 * self.size)
+
+    def add(self, i: int) -> None:
+        i += self.size
+        while i > 0:
+            self.counts[i] += 1
+            i //= 2
+
+    def remove(self, i: int) -> None:
+        i += self.size
+        while i > 0:
+            self.counts[i] -= 1
+            i //= 2
+
+    def next(self, i: int) -> Optional[int]:
+        """
+        Return the smallest element greater or equal to i, otherwise None
+        """
+        if i >= self.size:
+            return None
+        node = max(i, 0) + self.size
+        if self.counts[node] > 0:
+            return node - self.size
+        while node > 1:
+            if node % 2 == 0 and self.counts[node + 1] > 0:
+                node += 1
+                while node < self.size:
+                    node = 2 * node if self.counts[2 * node] > 0 else 2 * node + 1
+                return node - self.size
+            node //= 2
+        return None
+
+    def previous(self, i: int) -> Optional[int]:
+        """
+        Return the largest element smaller or equal to i, otherwise None
+        """
+        if i < 0:
+            return None
+        node = min(i, self.size - 1) + self.size
+        if self.counts[node] > 0:
+            return node - self.size
+        while node > 1:
+            if node % 2 == 1 and self.counts[node - 1] > 0:
+                node -= 1
+                while node < self.size:
+                    node = 2 * node + 1 if self.counts[2 * node + 1] > 0 else 2 * node
+                return node - self.size
+            node //= 2
+        return None
+
+def findCrossings(boundaries: AxialLineSet, y: np.ndarray, start: np.ndarray,
+                  forward: np.ndarray) -> np.ndarray:
+    """
+    Given boundaries sorted by x and arrays describing queries, find for each
+    query the index of the first boundary crossing y when going from start
+    forward (increasing index) or backward. Return an array of indices, -1
+    when there is no such boundary.
+
+    The queries are answered in a single sweep along y; the boundaries crossing
+    current y are kept in an IndexSet.
+    """
+    n, m = len(boundaries), len(y)
+    # Events at the same coordinate are ordered: open boundary, query, close
+    # boundary, so the boundary endpoints are considered crossing.
+    coords = np.concatenate((boundaries.min, np.asarray(y, dtype=np.float64),
+                             boundaries.max))
+    kinds = np.repeat([0, 1, 2], [n, m, n])
+    ids = np.concatenate((np.arange(n), np.arange(m), np.arange(n)))
+    order = np.lexsort((kinds, coords))
+
+    starts = np.asarray(start).tolist()
+    forwards = np.asarray(forward, dtype=bool).tolist()
+    active = IndexSet(n)
+    result = [-1] * m
+    for kind, i in zip(kinds[order].tolist(), ids[order].tolist()):
+        if kind == 0:
+            active.add(i)
+        elif kind == 2:
+            active.remove(i)
+        else:
+            crossing = active.next(starts[i]) if forwards[i] \
+                       else active.previous(starts[i])
+            if crossing is not None:
+                result[i] = crossing
+    return np.array(result, dtype=np.int64)
+
+def shadowExtents(lines: AxialLineSet, boundaries: AxialLineSet) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batch version of buildShadows. Return a tuple of arrays (left, right)
+    with the extents of the shadows.
+    """
+    if len(lines) == 0:
+        return np.empty(0), np.empty(0)
+    boundaries = boundaries.sortedByX()
+    xs = boundaries.x
+    beforeMax = np.searchsorted(xs, lines.max, side="left") - 1
+    afterMin = np.searchsorted(xs, lines.min, side="right")
+    # Extend to right; the closest boundary past l.min. Extend to left; the
+    # closest boundary before l.max.
+    crossings = findCrossings(boundaries,
+        np.concatenate((lines.x, lines.x)),
+        np.concatenate((np.maximum(beforeMax, afterMin), np.minimum(afterMin, beforeMax))),
+        np.repeat([True, False], len(lines)))
+    right, left = crossings[:len(lines)], crossings[len(lines):]
+    assert np.all(right >= 0)
+    assert np.all(left >= 0)
+    return xs[left], xs[right]
+
+def trimExtents(lines: AxialLineSet, shadows: AxialLineSet,
+                boundaries: AxialLineSet) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batch version of trimShadows. Shadows are given as a set of shadow lines
+    of the lines. Return a tuple of arrays (left, right) with the trimmed
+    extents of the shadows.
+    """
+    if len(boundaries) == 0:
+        return shadows.min.copy(), shadows.max.copy()
+    boundaries = boundaries.sortedByX()
+    xs = boundaries.x
+    # Trim right; the closest boundary past the line and the shadow start.
+    # Trim left; the closest boundary before the line and the shadow end.
+    rightStart = np.searchsorted(xs, np.maximum(lines.min, shadows.min), side="right")
+    leftStart = np.minimum(np.searchsorted(xs, lines.max, side="right"),
+                           np.searchsorted(xs, shadows.max, side="left")) - 1
+    crossings = findCrossings(boundaries,
+        np.concatenate((lines.x, lines.x)),
+        np.concatenate((rightStart, leftStart)),
+        np.repeat([True, False], len(lines)))
+    right, left = crossings[:len(lines)], crossings[len(lines):]
+    rightTrim = np.where((right >= 0) & (xs[right] <= shadows.max), xs[right], shadows.max)
+    leftTrim = np.where((left >= 0) & (xs[left] >= shadows.min), xs[left], shadows.min)
+    return leftTrim, rightTrim
+
 def buildShadows(lines: Iterable[AxialLine], boundaries: Iterable[AxialLine]) -> List[ShadowLine]:
     """
     Given an iterable of AxialLines, build their prolonged shadows. Shadows
@@ -407,57 +676,24 @@ def buildShadows(lines: Iterable[AxialLine], boundaries: Iterable[AxialLine]) ->
     perpendicular to each other. This function assumes there is a boundary for
     every line.
     """
-    boundaries = list(boundaries)
-    boundaries.sort(key=lambda line: line.x)
-
-    shadowLines: List[ShadowLine] = []
-    for l in lines:
-        # Extend to right
-        righStart = lowerBound(boundaries, l.max, key=lambda line: line.x)
-        for i in range(righStart, len(boundaries)):
-            b = boundaries[i]
-            if l.x in b and b.x > l.min:
-                rightExtend = b.x
-                break
-        # Extend to left
-        leftStart = upperBound(boundaries, l.min, key=lambda line: line.x)
-        for i in range(leftStart, 0, -1):
-            b  = boundaries[i]
-            if l.x in b and b.x < l.max:
-                leftExtend = b.x
-                break
-        assert rightExtend is not None
-        assert leftExtend is not None
-        shadowLines.append(ShadowLine(l, Interval(leftExtend, rightExtend)))
-    return shadowLines
+    lines = list(lines)
+    left, right = shadowExtents(AxialLineSet.fromLines(lines),
+                                AxialLineSet.fromLines(boundaries))
+    return [ShadowLine(l, Interval(a, b))
+            for l, a, b in zip(lines, left.tolist(), right.tolist())]
 
 def trimShadows(shadows: Iterable[ShadowLine], boundaries: Iterable[AxialLine]) -> List[ShadowLine]:
     """
     Given an iterable of ShadowLines and Axial lines as boudaries, trim the
     shadows so they do not cross any boundary. Return new shadows.
     """
-    boundaries = list(boundaries)
-    boundaries.sort(key=lambda line: line.x)
-    newShadows: List[ShadowLine] = []
-    for l in shadows:
-        # Trim right
-        rightStart = upperBound(boundaries, l.line.min, key=lambda line: line.x)
-        rightTrim = l.shadow.max
-        for i in range(rightStart, len(boundaries)):
-            b = boundaries[i]
-            if l.line.x in b and l.shadow.min < b.x <= l.shadow.max:
-                rightTrim = b.x
-                break
-        # Trim left
-        leftStart = upperBound(boundaries, l.line.max, key=lambda line: line.x) - 1
-        leftTrim = l.shadow.min
-        for i in range(leftStart, 0, -1):
-            b = boundaries[i]
-            if l.line.x in b and l.shadow.min <= b.x < l.shadow.max:
-                leftTrim = b.x
-                break
-        newShadows.append(ShadowLine(l.line, Interval(leftTrim, rightTrim)))
-    return newShadows
+    shadows = list(shadows)
+    lines = AxialLineSet.fromLines([l.line for l in shadows])
+    shadowSet = lines.withSpan([l.shadow.min for l in shadows],
+                               [l.shadow.max for l in shadows])
+    left, right = trimExtents(lines, shadowSet, AxialLineSet.fromLines(boundaries))
+    return [ShadowLine(l.line, Interval(a, b))
+            for l, a, b in zip(shadows, left.tolist(), right.tolist())]
 
 class BoxPartitionLines:
     """
@@ -491,25 +727,27 @@ class BoxPartitionLines:
         """
         from kikit.common import shpBBoxExpand
 
-        hstops, vstops = collectHardStops(boxes.values())
-        hSafeStops, vSafeStops = collectHardStops([
+        hstops, vstops = collectHardStopSets(boxes.values())
+        hSafeStops, vSafeStops = collectHardStopSets([
             shpBBoxExpand(x, safeVerticalMargin, safeHorizontalMargin) for x in boxes.values()])
-        hseeds, vseeds = collectSeedLines(boxes, seedFilter)
-        hshadows = buildShadows(hseeds, chain(vstops, vSafeStops))
-        vshadows = buildShadows(vseeds, chain(hstops, hSafeStops))
-
-        hPartition = trimShadows(hshadows, chain(
-            [x.shadowLine for x in vshadows], vSafeStops))
-        vPartition = trimShadows(vshadows, chain(
-            [x.shadowLine for x in hshadows], hSafeStops))
+        hseedList, vseedList = collectSeedLines(boxes, seedFilter)
+        hseeds = AxialLineSet.fromLines(hseedList)
+        vseeds = AxialLineSet.fromLines(vseedList)
+        hshadows = hseeds.withSpan(*shadowExtents(hseeds,
+            AxialLineSet.concatenate([vstops, vSafeStops])))
+        vshadows = vseeds.withSpan(*shadowExtents(vseeds,
+            AxialLineSet.concatenate([hstops, hSafeStops])))
+
+        hPartition = hseeds.withSpan(*trimExtents(hseeds, hshadows,
+            AxialLineSet.concatenate([vshadows, vSafeStops])))
+        vPartition = vseeds.withSpan(*trimExtents(vseeds, vshadows,
+            AxialLineSet.concatenate([hshadows, hSafeStops])))
 
         self.query: Dict[object, Tuple[List[AxialLine], List[AxialLine]]] = { ident: ([], []) for ident in boxes.keys() }
-        for l in hPartition:
-            self.query[l.line.tag][0].append(
-                AxialLine(l.line.x, l.shadow.min, l.shadow.max))
-        for l in vPartition:
-            self.query[l.line.tag][1].append(
-                AxialLine(l.line.x, l.shadow.min, l.shadow.max))
+        for l in hPartition.lines():
+            self.query[l.tag][0].append(AxialLine(l.x, l.min, l.max))
+        for l in vPartition.lines():
+            self.query[l.tag][1].append(AxialLine(l.x, l.min, l.max))
 
     def partitionLines(self, ident: object) -> Tuple[List[AxialLine], List[AxialLine]]:
         """
@@ -525,19 +763,19 @@ class BoxPartitionLines:
         """
         import matplotlib.pyplot as plt
 
-        for h in vars["hstops"]:
+        for h in vars["hstops"].lines():
             plt.hlines(h.x, h.min, h.max, ["g"])
-        for v in vars["vstops"]:
+        for v in vars["vstops"].lines():
             plt.vlines(v.x, v.min, v.max, ["g"])
 
         plt.axis('equal')
-        for h in vars["hshadows"]:
-            plt.hlines(h.line.x, h.shadow.min, h.shadow.max, ["r"])
-        for v in vars["vshadows"]:
-            plt.vlines(v.line.x, v.shadow.min, v.shadow.max, ["r"])
+        for h in vars["hshadows"].lines():
+            plt.hlines(h.x, h.min, h.max, ["r"])
+        for v in vars["vshadows"].lines():
+            plt.vlines(v.x, v.min, v.max, ["r"])
 
-        for h in vars["hseeds"]:
+        for h in vars["hseeds"].lines():
             plt.hlines(h.x, h.min, h.max)
-        for v in vars["vseeds"]:
+        for v in vars["vseeds"].lines():
             plt.vlines(v.x, v.min, v.max)
         plt.show()
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Optional, Tuple
 from .common import KiLength
 from .units import mm
 from .sexpr import SExpr, findNode
@@ -9,6 +9,9 @@ def getPageDimensionsFromAst(ast: SExpr) -> Tuple[KiLength, KiLength]:
     if paperNode is None:
         # KiCAD 5 board use "page" instead of "paper"
         paperNode = findNode(ast, "page")
+    return getPageDimensionsFromNode(paperNode)
+
+def getPageDimensionsFromNode(paperNode: Optional[SExpr]) -> Tuple[KiLength, KiLength]:
     if paperNode is None:
         raise RuntimeError("Source document doesn't contain paper size information")
     value = paperNode.items[1].value
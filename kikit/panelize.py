@@ -15,21 +15,25 @@ from shapely.geometry import (Polygon, MultiPolygon, Point, LineString, box,
 from shapely.prepared import prep
 import shapely
 import shapely.affinity
+import shapely.wkb
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product, chain
 import numpy as np
 import os
 import json
+import pickle
 from collections import OrderedDict
 
 from kikit import substrate
 from kikit import units
-from kikit.kicadUtil import getPageDimensionsFromAst
+from kikit.kicadUtil import getPageDimensionsFromNode
 from kikit.substrate import Substrate, linestringToKicad, extractRings
 from kikit.defs import PAPER_DIMENSIONS, STROKE_T, Layer, EDA_TEXT_HJUSTIFY_T, EDA_TEXT_VJUSTIFY_T, PAPER_SIZES
 from kikit.common import *
-from kikit.sexpr import parseSexprF, SExpr, Atom, findNode
+from kikit.sexpr import readTopLevelNode, replaceTopLevelNode, SExpr, Atom, findNode
 from kikit.annotations import AnnotationReader, TabAnnotation
 from kikit.drc import DrcExclusion, readBoardDrcExclusions, serializeExclusion
+from kikit.transformation import AffineTransformation
 from kikit.units import mm, deg
 
 class PanelError(RuntimeError):
@@ -178,10 +182,7 @@ def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
     yieldMapping callback. This callback is invoked with an old ID and the new
     ID. Mapping is applicable only in v6.
     """
-    try:
-        newItem = item.Duplicate()
-    except TypeError: # Footprint has overridden the method, cannot be called directly
-        newItem = pcbnew.Cast_to_BOARD_ITEM(item).Duplicate().Cast()
+    newItem = duplicateItem(item)
     board.Add(newItem)
     if not yieldMapping:
         return
@@ -196,6 +197,35 @@ def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
                 yieldMapping(o.m_Uuid.AsString(), n.m_Uuid.AsString())
     yieldMapping(item.m_Uuid.AsString(), newItem.m_Uuid.AsString())
 
+def duplicateItem(item: pcbnew.BOARD_ITEM) -> pcbnew.BOARD_ITEM:
+    """
+    Make a copy of the item with fresh identifiers. The copy is not added to
+    any board.
+    """
+    try:
+        newItem = item.Duplicate()
+    except TypeError: # Footprint has overridden the method, cannot be called directly
+        newItem = pcbnew.Cast_to_BOARD_ITEM(item).Duplicate()
+    return newItem.Cast()
+
+def yieldItemMapping(original: pcbnew.BOARD_ITEM, copy: pcbnew.BOARD_ITEM,
+                     yieldMapping: Callable[[str, str], None]) -> None:
+    """
+    Given an item and its (possibly transformed) copy, yield mapping between
+    their identifiers via the yieldMapping callback. For footprints, the mapping
+    of pads, graphical items and zones is also yielded. Graphical items on
+    Edge.Cuts are expected to be removed from the copy and they are skipped.
+    """
+    if isinstance(original, pcbnew.FOOTPRINT):
+        graphics = lambda x: [g for g in x.GraphicalItems() if g.GetLayer() != Layer.Edge_Cuts]
+        for getter in [lambda x: x.Pads(), graphics, lambda x: x.Zones()]:
+            oldList = getter(original)
+            newList = getter(copy)
+            assert len(oldList) == len(newList)
+            for o, n in zip(oldList, newList):
+                yieldMapping(o.m_Uuid.AsString(), n.m_Uuid.AsString())
+    yieldMapping(original.m_Uuid.AsString(), copy.m_Uuid.AsString())
+
 def collectNetNames(board):
     return [str(x) for x in board.GetNetInfo().NetsByName() if len(str(x)) > 0]
 
@@ -250,18 +280,32 @@ def roundPoint(point, precision=-4):
         return Point(round(point.x, precision), round(point.y, precision))
     return Point(round(point[0], precision), round(point[1], precision))
 
+def placementTransformation(rotation: KiAngle, origin: KiPoint,
+                            translation: KiPoint) -> AffineTransformation:
+    """
+    Return the transformation "rotate around origin and then translate" we
+    apply when placing a board.
+    """
+    return AffineTransformation.rotation(rotation.AsDegrees(), origin) \
+        .then(AffineTransformation.translation(translation))
+
+def placementRevertTransformation(rotation: KiAngle, origin: KiPoint,
+                                  translation: KiPoint) -> AffineTransformation:
+    """
+    Return the transformation that reverts placing a board. The point is
+    truncated to integers before the translation is undone, as KiCAD does.
+    """
+    return AffineTransformation.truncation().then(
+        placementTransformation(rotation, origin, translation).inverse())
+
 def doTransformation(point: KiPoint, rotation: KiAngle, origin: KiPoint, translation: KiPoint) -> VECTOR2I:
     """
-    Abuses KiCAD to perform a tranformation of a point
+    Perform a tranformation of a point; i.e., rotate it around origin and then
+    translate it.
     """
-    segment = pcbnew.PCB_SHAPE()
-    segment.SetShape(STROKE_T.S_SEGMENT)
-    segment.SetStart(toKiCADPoint(point))
-    segment.SetEnd(VECTOR2I(0, 0))
-    segment.Rotate(toKiCADPoint(origin), -1 * rotation)
-    segment.Move(toKiCADPoint(translation))
-    # We build a fresh VECTOR2I - otherwise there is a shared reference
-    return VECTOR2I(segment.GetStartX(), segment.GetStartY())
+    # Note that we historically rotate by the negative angle here
+    t = placementTransformation(-1 * rotation, origin, translation)
+    return toKiCADPoint(t(toKiCADPoint(point)))
 
 def undoTransformation(point, rotation, origin, translation):
     """
@@ -269,15 +313,8 @@ def undoTransformation(point, rotation, origin, translation):
     placing a board. Given a point and original transformation parameters,
     return the original point position.
     """
-    # Abuse PcbNew to do so
-    segment = pcbnew.PCB_SHAPE()
-    segment.SetShape(STROKE_T.S_SEGMENT)
-    segment.SetStart(VECTOR2I(int(point[0]), int(point[1])))
-    segment.SetEnd(VECTOR2I(0, 0))
-    segment.Move(VECTOR2I(-translation[0], -translation[1]))
-    segment.Rotate(origin, -1 * rotation)
-    # We build a fresh VECTOR2I - otherwise there is a shared reference
-    return VECTOR2I(segment.GetStartX(), segment.GetStartY())
+    t = placementRevertTransformation(rotation, origin, translation)
+    return toKiCADPoint(t(point))
 
 def removeCutsFromFootprint(footprint):
     """
@@ -388,6 +425,31 @@ def buildTabs(substrate: Substrate,
             cuts.append(c)
     return tabs, cuts
 
+def isPicklable(obj) -> bool:
+    """
+    Check whether an object can be passed to a process pool
+    """
+    try:
+        pickle.dumps(obj)
+        return True
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+
+def _buildTabsWkb(substrateWkb: bytes, partitionLinesWkb: bytes,
+                  tabAnnotations: List[TabAnnotation], fillet: KiLength,
+                  revertTransformation: Optional[Callable]) -> \
+                    Tuple[List[bytes], List[bytes]]:
+    """
+    Process pool counterpart of buildTabs. Geometry is passed as WKB, the
+    substrate is expected to be oriented.
+    """
+    s = Substrate([], revertTransformation=revertTransformation)
+    s.substrates = shapely.wkb.loads(substrateWkb)
+    s.oriented = True
+    tabs, cuts = buildTabs(s, shapely.wkb.loads(partitionLinesWkb),
+                           tabAnnotations, fillet)
+    return [t.wkb for t in tabs], [c.wkb for c in cuts]
+
 def normalizePartitionLineOrientation(line):
     """
     Given a LineString or MultiLineString, normalize orientation of the
@@ -435,6 +497,50 @@ def bakeTextVars(board: pcbnew.BOARD) -> None:
             continue
         drawing.SetText(drawing.GetShownText())
 
+class BoardTemplate:
+    """
+    A source board loaded into memory so it can be placed into a panel multiple
+    times. The board is parsed only once; each placement only duplicates and
+    transforms its items. The template itself is never modified.
+    """
+    def __init__(self, filename: Union[str, Path], bakeText: bool = False) -> None:
+        self.board = LoadBoard(str(filename))
+        if bakeText:
+            bakeTextVars(self.board)
+        self.netNames: List[str] = collectNetNames(self.board)
+        self._items: Dict[Tuple[int, int, int, int], Tuple[list, list, list, list]] = {}
+        self._drcExclusions: Optional[List[DrcExclusion]] = None
+        # Substrates of already placed instances keyed by source area, rotation
+        # origin and rotation angle together with the translation and bounding
+        # box of the instance. Further placements only translate them.
+        self.substratePrototypes: Dict[tuple, Tuple[Substrate, VECTOR2I, BOX2I]] = {}
+
+    def itemsInArea(self, sourceArea: BOX2I) -> Tuple[list, list, list, list]:
+        """
+        Return a tuple of drawings, footprints, tracks and zones that fit into
+        the source area. The result is cached per source area.
+        """
+        key = (sourceArea.GetX(), sourceArea.GetY(),
+               sourceArea.GetWidth(), sourceArea.GetHeight())
+        if key not in self._items:
+            self._items[key] = (
+                collectItems(self.board.GetDrawings(), sourceArea),
+                collectFootprints(self.board.GetFootprints(), sourceArea),
+                collectItems(self.board.GetTracks(), sourceArea),
+                collectItems(self.board.Zones(), sourceArea))
+        return self._items[key]
+
+    def drcExclusions(self) -> List[DrcExclusion]:
+        """
+        Return DRC exclusions of the board. Boards without a project have none.
+        """
+        if self._drcExclusions is None:
+            try:
+                self._drcExclusions = readBoardDrcExclusions(self.board)
+            except FileNotFoundError:
+                self._drcExclusions = []
+        return self._drcExclusions
+
 class Panel:
     """
     Basic interface for panel building. Instance of this class represents a
@@ -456,7 +562,7 @@ class Panel:
         self.board = pcbnew.NewBoard(panelFilename)
         self.sourcePaths = set() # A set of all board files that were appended to the panel
         self.substrates = [] # Substrates of the individual boards; e.g. for masking
-        self.boardSubstrate = Substrate([]) # Keep substrate in internal representation,
+        self.boardSubstrate = Substrate([], deferUnion=True) # Keep substrate in internal representation,
                                             # Draw it just before saving
         self.backboneLines = []
         self.hVCuts = set() # Keep V-cuts as numbers and append them just before saving
@@ -465,6 +571,10 @@ class Panel:
         self.vCutClearance = 0
         self.copperLayerCount = None
         self.zonesToRefill = pcbnew.ZONES()
+        # Detached copies of footprints placed by the panel (e.g., NPTH holes,
+        # fiducials) keyed by their parameters. Placing another one only
+        # duplicates the prototype instead of loading it from the library.
+        self.footprintPrototypes: Dict[Tuple, pcbnew.FOOTPRINT] = {}
         self.pageSize: Union[None, str, Tuple[int, int]] = None
 
         self.annotationReader: AnnotationReader = AnnotationReader.getDefault()
@@ -483,13 +593,27 @@ class Panel:
         self.chamferWidth: Optional[KiLength] = None
         self.chamferHeight: Optional[KiLength] = None
 
-    def save(self, reconstructArcs: bool=False, refillAllZones: bool=False):
+        # Source boards are loaded only once and then cloned for every
+        # placement. Keyed by absolute path and text baking.
+        self._boardTemplates: Dict[Tuple[str, bool], BoardTemplate] = {}
+
+    def save(self, reconstructArcs: bool=False, refillAllZones: bool=False) -> int:
         """
         Saves the panel to a file and makes the requested changes to the prl and
-        pro files.
+        pro files. Returns the number of bytes written to the board file.
         """
         panelEdges = self.boardSubstrate.serialize(reconstructArcs)
-        boardsEdges = self._getRefillEdges(reconstructArcs)
+
+        singlePass = not refillAllZones and len(self.zonesToRefill) == 0
+        if singlePass:
+            # There is nothing to fill, so we can render the panel edges
+            # directly and save the board only once. The original edges are
+            # put aside and restored after saving.
+            boardEdges = [edge for edge in self.board.GetDrawings()
+                          if edge.GetLayer() == Layer.Edge_Cuts and
+                             not isinstance(edge, pcbnew.PCB_DIMENSION_BASE)]
+            for edge in boardEdges:
+                self.board.Remove(edge)
 
         vcuts = self._renderVCutH() + self._renderVCutV()
         keepouts = []
@@ -498,11 +622,29 @@ class Panel:
             if clearanceArea is not None:
                 keepouts.append(self.addKeepout(clearanceArea))
 
+        if singlePass:
+            for edge in panelEdges:
+                self.board.Add(edge)
+            written = self._saveBoard(self.board)
+            self.makeLayersVisible() # as they are not in KiCAD 6
+            self.transferProjectSettings()
+
+            for cut, _ in vcuts:
+                self.board.Remove(cut)
+            for keepout in keepouts:
+                self.board.Remove(keepout)
+            for edge in panelEdges:
+                self.board.Remove(edge)
+            for edge in boardEdges:
+                self.board.Add(edge)
+            return written + self._adjustPageSize()
+
         # Rendering happens in two phases:
         # - first, we render original board edges and save the board (to
         #   propagate all the design rules from project files)
         # - then we load the board, fill polygons and render panel edges.
 
+        boardsEdges = self._getRefillEdges(reconstructArcs)
         for edge in boardsEdges:
             self.board.Add(edge)
 
@@ -513,7 +655,7 @@ class Panel:
             newName = f"KIKIT_zone_{i}"
             originalZoneNames[newName] = zone.GetZoneName()
             zone.SetZoneName(newName)
-        self.board.Save(self.filename)
+        written = self._saveBoard(self.board)
 
         self.makeLayersVisible() # as they are not in KiCAD 6
         self.transferProjectSettings()
@@ -551,8 +693,15 @@ class Panel:
                 zone.SetZoneName(originalZoneNames[zName])
         fillerTool.Fill(zonesToRefill)
 
-        fillBoard.Save(self.filename)
-        self._adjustPageSize()
+        written += self._saveBoard(fillBoard)
+        return written + self._adjustPageSize()
+
+    def _saveBoard(self, board: pcbnew.BOARD) -> int:
+        """
+        Save the board to the panel file, return the number of bytes written.
+        """
+        board.Save(self.filename)
+        return os.path.getsize(self.filename)
 
     def _getRefillEdges(self, reconstructArcs: bool):
         """
@@ -670,45 +819,35 @@ class Panel:
             defaultNetClass.addNet(netRenamer(name))
 
 
-    def _adjustPageSize(self) -> None:
+    def _adjustPageSize(self) -> int:
         """
         Open the just saved panel file and syntactically change the page size.
         At the moment, there is no API do so, therefore this extra step is
-        required.
+        required. Only the paper node in the header is rewritten, the rest of
+        the file is streamed. Returns the number of bytes written.
         """
         if self.pageSize is None:
-            return
-        with open(self.filename, "r", encoding="utf-8") as f:
-            tree = parseSexprF(f, limit=10) # Introduce limit to speed up parsing
-        # Find paper property
-        paperExpr = None
-        for subExpr in tree:
-            if not isinstance(subExpr, SExpr):
-                continue
-            if len(subExpr) > 0 and isinstance(subExpr[0], Atom) and subExpr[0].value == "paper":
-                paperExpr = subExpr
-                break
-        assert paperExpr is not None
+            return 0
 
         if isinstance(self.pageSize, str):
             paperProps = self.pageSize.split("-")
-            paperExpr.items = [
+            paperExpr = SExpr([
                 Atom("paper"),
                 Atom(paperProps[0], " ", quoted=True)
-            ]
+            ])
             if len(paperProps) > 1:
                 paperExpr.items.append(Atom("portrait", " "))
         else:
             pageSize = [float(x) / units.mm for x in self.pageSize]
-            paperExpr.items = [
+            paperExpr = SExpr([
                 Atom("paper"),
                 Atom("User", " ", quoted=True),
                 Atom(str(pageSize[0]), " "),
                 Atom(str(pageSize[1]), " "),
-            ]
+            ])
 
-        with open(self.filename, "w", encoding="utf-8") as f:
-            f.write(str(tree))
+        return replaceTopLevelNode(self.filename, ["paper"], str(paperExpr),
+            limit=10)
 
 
     def inheritDesignSettings(self, board):
@@ -747,9 +886,10 @@ class Panel:
         # What follows is a hack as KiCAD has no API for page access. Therefore,
         # we have to read out the page size from the source board and save it so
         # we can recover it.
-        with open(board.GetFileName(), "r", encoding="utf-8") as f:
-            tree = parseSexprF(f, limit=10) # Introduce limit to speed up parsing
-        self._inheritedPageDimensions = getPageDimensionsFromAst(tree)
+        # KiCAD 5 board use "page" instead of "paper"
+        paperNode = readTopLevelNode(board.GetFileName(), ["paper", "page"],
+            limit=10) # Introduce limit to speed up scanning
+        self._inheritedPageDimensions = getPageDimensionsFromNode(paperNode)
 
     def setPageSize(self, size: Union[str, Tuple[int, int]] ) -> None:
         """
@@ -831,6 +971,12 @@ class Panel:
 
         Similarly, you can substitute variables in the text via bakeText.
 
+        The board file is loaded only once per panel. Appending the same board
+        again (e.g., when building a grid) reuses the already loaded board, so
+        changes made to the file in the meantime are not reflected. Similarly,
+        the substrate is built only once for every source area and rotation;
+        further placements only translate it.
+
         Returns bounding box (BOX2I) of the extracted area placed at the
         destination and the extracted substrate of the board.
         """
@@ -841,11 +987,10 @@ class Panel:
             raise RuntimeError("Board rotation has to be passed as EDA_ANGLE, not a number")
 
 
-        board = LoadBoard(str(filename))
+        template = self._getBoardTemplate(filename, bakeText)
+        board = template.board
         if inheritDrc:
             self.sourcePaths.add(filename)
-        if bakeText:
-            bakeTextVars(board)
 
         thickness = board.GetDesignSettings().GetBoardThickness()
         if len(self.substrates) == 0:
@@ -873,24 +1018,23 @@ class Panel:
         netRenamerFn = lambda x: netRenamer(bId, x)
 
         self._inheritNetClasses(board, netRenamerFn)
+        netMapping = self._addRenamedNets(template.netNames, netRenamerFn)
 
-        renameNets(board, netRenamerFn)
-        if refRenamer is not None:
-            renameRefs(board, lambda x: refRenamer(len(self.substrates), x))
-
-        drawings = collectItems(board.GetDrawings(), enlargedSourceArea)
-        footprints = collectFootprints(board.GetFootprints(), enlargedSourceArea)
-        tracks = collectItems(board.GetTracks(), enlargedSourceArea)
-        zones = collectItems(board.Zones(), enlargedSourceArea)
+        drawings, footprints, tracks, zones = template.itemsInArea(enlargedSourceArea)
 
         itemMapping: Dict[str, str] = {} # string KIID to string KIID
         def yieldMapping(old: str, new: str) -> None:
             nonlocal itemMapping
             itemMapping[old] = new
 
+        # The template is never modified, we only transform its copies
         edges = []
         annotations = []
-        for footprint in footprints:
+        for sourceFootprint in footprints:
+            footprint = duplicateItem(sourceFootprint)
+            if refRenamer is not None:
+                ref = footprint.Reference().GetText()
+                footprint.Reference().SetText(refRenamer(bId, ref))
             # We want to rotate text within footprints by the requested amount,
             # even if that text has "keep upright" attribute set. For that,
             # the attribute must be first removed without changing the
@@ -906,63 +1050,102 @@ class Panel:
             if interpretAnnotations and self.annotationReader.isAnnotation(footprint):
                 annotations.extend(self.annotationReader.convertToAnnotation(footprint))
             else:
-                appendItem(self.board, footprint, yieldMapping)
-        for track in tracks:
-            track.Rotate(originPoint, rotationAngle)
-            track.Move(translation)
-            appendItem(self.board, track, yieldMapping)
-        for zone in zones:
-            zone.Rotate(originPoint, rotationAngle)
-            zone.Move(translation)
-            appendItem(self.board, zone, yieldMapping)
-        for netId in board.GetNetInfo().NetsByNetcode():
-            self.board.Add(board.GetNetInfo().GetNetItem(netId))
-
-        # Treat drawings differently since they contains board edges
-        for drawing in drawings:
+                self.board.Add(footprint)
+                remapNets(footprint.Pads(), netMapping)
+                yieldItemMapping(sourceFootprint, footprint, yieldMapping)
+        for sourceItem in chain(tracks, zones):
+            item = duplicateItem(sourceItem)
+            item.Rotate(originPoint, rotationAngle)
+            item.Move(translation)
+            self.board.Add(item)
+            remapNets([item], netMapping)
+            yieldItemMapping(sourceItem, item, yieldMapping)
+
+        # Treat drawings differently since they contains board edges. The
+        # edges are needed only when the substrate is not known yet.
+        prototypeKey = (enlargedSourceArea.GetX(), enlargedSourceArea.GetY(),
+                        enlargedSourceArea.GetWidth(), enlargedSourceArea.GetHeight(),
+                        originPoint[0], originPoint[1], rotationAngle.AsDegrees())
+        prototype = template.substratePrototypes.get(prototypeKey)
+        otherDrawings = []
+        for sourceDrawing in drawings:
+            if isBoardEdge(sourceDrawing) and prototype is not None:
+                continue
+            drawing = duplicateItem(sourceDrawing)
             drawing.Rotate(originPoint, rotationAngle)
             drawing.Move(translation)
-        edges += [edge for edge in drawings if isBoardEdge(edge)]
-        otherDrawings = [edge for edge in drawings if not isBoardEdge(edge)]
+            if isBoardEdge(drawing):
+                edges.append(drawing)
+            else:
+                otherDrawings.append((sourceDrawing, drawing))
+
+        revertTransformation = placementRevertTransformation(
+            rotationAngle, originPoint, translation)
+        if prototype is None:
+            try:
+                s = Substrate(edges, 0,
+                    revertTransformation=revertTransformation)
+            except substrate.PositionError as e:
+                point = undoTransformation(e.point, rotationAngle, originPoint, translation)
+                raise substrate.PositionError(f"{filename}: {e.origMessage}", point)
+            bBox = findBoundingBox(edges)
+            # Store a copy as the placed substrate can be modified later
+            template.substratePrototypes[prototypeKey] = \
+                (s.translated((0, 0)), translation, bBox)
+        else:
+            protoSubstrate, protoTranslation, protoBBox = prototype
+            shift = (translation[0] - protoTranslation[0],
+                     translation[1] - protoTranslation[1])
+            s = protoSubstrate.translated(shift, revertTransformation)
+            bBox = BOX2I(VECTOR2I(protoBBox.GetX() + shift[0], protoBBox.GetY() + shift[1]),
+                         VECTOR2I(protoBBox.GetWidth(), protoBBox.GetHeight()))
+        self.boardSubstrate.union(s)
+        self.substrates.append(s)
+        self.substrates[-1].annotations = annotations
+        for sourceDrawing, drawing in otherDrawings:
+            self.board.Add(drawing)
+            yieldItemMapping(sourceDrawing, drawing, yieldMapping)
+
+        for drcE in template.drcExclusions():
+            try:
+                newObjects = [self.board.GetItem(pcbnew.KIID(itemMapping[x.m_Uuid.AsString()])) for x in drcE.objects]
+                assert all(x is not None for x in newObjects)
+                newPosition = doTransformation(drcE.position, rotationAngle, originPoint, translation)
+                self.drcExclusions.append(DrcExclusion(
+                    drcE.type,
+                    newPosition,
+                    newObjects
+                ))
+            except KeyError as e:
+                continue # We cannot handle DRC exclusions with board edges
 
-        def makeRevertTransformation(angle, origin, translation):
-            def f(point):
-                return undoTransformation(point, angle, origin, translation)
-            return f
+        self.projectVars.append(self._readProjectVariables(board))
 
-        revertTransformation = makeRevertTransformation(rotationAngle, originPoint, translation)
-        try:
-            s = Substrate(edges, 0,
-                revertTransformation=revertTransformation)
-            self.boardSubstrate.union(s)
-            self.substrates.append(s)
-            self.substrates[-1].annotations = annotations
-        except substrate.PositionError as e:
-            point = undoTransformation(e.point, rotationAngle, originPoint, translation)
-            raise substrate.PositionError(f"{filename}: {e.origMessage}", point)
-        for drawing in otherDrawings:
-            appendItem(self.board, drawing, yieldMapping)
+        return bBox
 
-        try:
-            exclusions = readBoardDrcExclusions(board)
-            for drcE in exclusions:
-                try:
-                    newObjects = [self.board.GetItem(pcbnew.KIID(itemMapping[x.m_Uuid.AsString()])) for x in drcE.objects]
-                    assert all(x is not None for x in newObjects)
-                    newPosition = doTransformation(drcE.position, rotationAngle, originPoint, translation)
-                    self.drcExclusions.append(DrcExclusion(
-                        drcE.type,
-                        newPosition,
-                        newObjects
-                    ))
-                except KeyError as e:
-                    continue # We cannot handle DRC exclusions with board edges
-        except FileNotFoundError:
-            pass # Ignore boards without a project
-
-        self.projectVars.append(self._readProjectVariables(board))
+    def _getBoardTemplate(self, filename: Union[str, Path], bakeText: bool) -> BoardTemplate:
+        """
+        Return a template for the given board file. The board is loaded only
+        on the first request.
+        """
+        key = (os.path.abspath(str(filename)), bakeText)
+        if key not in self._boardTemplates:
+            self._boardTemplates[key] = BoardTemplate(filename, bakeText)
+        return self._boardTemplates[key]
 
-        return findBoundingBox(edges)
+    def _addRenamedNets(self, netNames: Iterable[str],
+                        renamer: Callable[[str], str]) -> Dict[str, Any]:
+        """
+        Add renamed copies of the nets to the panel. Return a dictionary
+        mapping the original net names to the newly created nets.
+        """
+        netinfo = self.board.GetNetInfo()
+        mapping = { "": netinfo.GetNetItem("") }
+        for name in netNames:
+            newNet = pcbnew.NETINFO_ITEM(self.board, renamer(name))
+            self.board.Add(newNet)
+            mapping[name] = newNet
+        return mapping
 
     def _readProjectVariables(self, board: pcbnew.BOARD) -> Dict[str, str]:
         projectPath = self.getProFilepath(board.GetFileName())
@@ -1354,7 +1537,7 @@ class Panel:
         Take a list of cuts and perform mouse bites. The cuts can be prolonged
         to
         """
-        bloatedSubstrate = prep(self.boardSubstrate.substrates.buffer(SHP_EPSILON))
+        bloatedSubstrate = self.boardSubstrate.substrates.buffer(SHP_EPSILON)
         offsetCuts = []
         for cut in cuts:
             cut = cut.simplify(SHP_EPSILON) # Remove self-intersecting geometry
@@ -1362,16 +1545,43 @@ class Panel:
             offsetCut = cut.parallel_offset(offset, "left")
             offsetCuts.append(offsetCut)
 
-        for cut in listGeometries(shapely.ops.unary_union(offsetCuts).simplify(SHP_EPSILON)):
-            length = cut.length
-            count = int(length / spacing) + 1
-            for i in range(count):
-                if count == 1:
-                    hole = cut.interpolate(0.5, normalized=True)
-                else:
-                    hole = cut.interpolate( i * length / (count - 1) )
-                if bloatedSubstrate.intersects(hole):
-                    self.addNPTHole(toKiCADPoint((hole.x, hole.y)), diameter)
+        offsetCuts = [cut for cut in listGeometries(
+                        shapely.ops.unary_union(offsetCuts).simplify(SHP_EPSILON))
+                      if not cut.is_empty]
+        if len(offsetCuts) == 0:
+            return
+        if not hasattr(shapely, "line_interpolate_point"):
+            # Shapely 1.x lacks the vectorized operations
+            preparedSubstrate = prep(bloatedSubstrate)
+            holes = []
+            for cut in offsetCuts:
+                length = cut.length
+                count = int(length / spacing) + 1
+                for i in range(count):
+                    if count == 1:
+                        hole = cut.interpolate(0.5, normalized=True)
+                    else:
+                        hole = cut.interpolate( i * length / (count - 1) )
+                    if preparedSubstrate.intersects(hole):
+                        holes.append(toKiCADPoint((hole.x, hole.y)))
+            self.addNPTHoles(holes, diameter)
+            return
+
+        # Place count holes evenly along each cut; a single hole goes to the
+        # middle of the cut
+        lengths = np.array([cut.length for cut in offsetCuts])
+        counts = (lengths / spacing).astype(int) + 1
+        holeCuts = np.repeat(np.array(offsetCuts, dtype=object), counts)
+        holeLengths = np.repeat(lengths, counts)
+        holeCounts = np.repeat(counts, counts)
+        indices = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        distances = np.where(holeCounts == 1, holeLengths / 2,
+            indices * holeLengths / np.maximum(holeCounts - 1, 1))
+        holes = shapely.line_interpolate_point(holeCuts, distances)
+        shapely.prepare(bloatedSubstrate)
+        holes = holes[shapely.intersects(bloatedSubstrate, holes)]
+        self.addNPTHoles([toKiCADPoint(tuple(c))
+                          for c in shapely.get_coordinates(holes)], diameter)
 
     def makeCutsToLayer(self, cuts, layer=Layer.Cmts_User, prolongation=fromMm(0)):
         """
@@ -1398,6 +1608,24 @@ class Panel:
         Add a drilled non-plated hole to the position (`VECTOR2I`) with given
         diameter. The paste option allows to place the hole on the paste layers.
         """
+        self._placeFootprint(("NPTH", diameter, paste), position,
+            lambda position: self._placeNPTHole(position, diameter, paste))
+
+    def addNPTHoles(self, positions: Iterable[VECTOR2I], diameter: KiLength,
+                    paste: bool=False) -> None:
+        """
+        Add drilled non-plated holes with given diameter to all positions
+        (`VECTOR2I`). The footprint is loaded from the library at most once,
+        the other holes are copies of it (see `addNPTHole`).
+        """
+        for position in positions:
+            self.addNPTHole(position, diameter, paste)
+
+    def _placeNPTHole(self, position: VECTOR2I, diameter: KiLength, paste: bool) -> pcbnew.FOOTPRINT:
+        """
+        Load the non-plated hole footprint from the library, set it up and add
+        it to the board at the position. Return the placed footprint.
+        """
         footprint = pcbnew.FootprintLoad(KIKIT_LIB, "NPTH")
         footprint.SetPosition(position)
         for pad in footprint.Pads():
@@ -1409,6 +1637,7 @@ class Panel:
                 layerSet.AddLayer(Layer.B_Paste)
                 pad.SetLayerSet(layerSet)
         self.board.Add(footprint)
+        return footprint
 
     def addFiducial(self, position: VECTOR2I, copperDiameter: KiLength,
                     openingDiameter: KiLength, bottom: bool = False,
@@ -1420,6 +1649,18 @@ class Panel:
         fiducial can also have an opening on the stencil. This is enabled by
         paste = True.
         """
+        self._placeFootprint(
+            ("Fiducial", copperDiameter, openingDiameter, bottom, paste), position,
+            lambda position: self._placeFiducial(position, copperDiameter,
+                openingDiameter, bottom, paste))
+
+    def _placeFiducial(self, position: VECTOR2I, copperDiameter: KiLength,
+                       openingDiameter: KiLength, bottom: bool,
+                       paste: bool) -> pcbnew.FOOTPRINT:
+        """
+        Load the fiducial footprint from the library, add it to the board at
+        the position and set it up. Return the placed footprint.
+        """
         footprint = pcbnew.FootprintLoad(KIKIT_LIB, "Fiducial")
         # As of V6, the footprint first needs to be added to the board,
         # then we can change its properties. Otherwise, it misses parent pointer
@@ -1436,7 +1677,24 @@ class Panel:
                 pad.SetLayerSet(layerSet)
         if bottom:
             footprint.Flip(position, False)
+        return footprint
 
+    def _placeFootprint(self, key: Tuple, position: VECTOR2I,
+                        place: Callable[[VECTOR2I], pcbnew.FOOTPRINT]) -> pcbnew.FOOTPRINT:
+        """
+        Place a copy of the footprint prototype identified by key to the
+        position. If there is no such prototype yet, place(position) adds a new
+        footprint to the board and its copy becomes the prototype.
+        """
+        prototype = self.footprintPrototypes.get(key)
+        if prototype is None:
+            footprint = place(position)
+            self.footprintPrototypes[key] = duplicateItem(footprint)
+            return footprint
+        footprint = duplicateItem(prototype)
+        footprint.SetPosition(position)
+        self.board.Add(footprint)
+        return footprint
 
     def panelCorners(self, horizontalOffset=0, verticalOffset=0):
         """
@@ -1504,21 +1762,66 @@ class Panel:
             s.annotations = list(
                 filter(lambda x: not isinstance(x, TabAnnotation), s.annotations))
 
-    def buildTabsFromAnnotations(self, fillet: KiLength) -> List[LineString]:
+    def buildTabsFromAnnotations(self, fillet: KiLength, workers: int = 1) -> List[LineString]:
         """
         Given annotations for the individual substrates, create tabs for them.
         Tabs are appended to the panel, cuts are returned.
 
         Expects that a valid partition line is assigned to the the panel.
+
+        With workers > 1, the tabs of the individual substrates are built in a
+        process pool. A single substrate, or substrates whose revert
+        transformation cannot be pickled, are built in this process.
         """
+        if workers > 1 and len(self.substrates) > 1:
+            results = self._buildTabsParallel(fillet, workers)
+        else:
+            results = [buildTabs(s, s.partitionLine, s.annotations, fillet)
+                for s in self.substrates]
         tabs, cuts = [], []
-        for s in self.substrates:
-            t, c = buildTabs(s, s.partitionLine, s.annotations, fillet)
+        for t, c in results:
             tabs.extend(t)
             cuts.extend(c)
         self.boardSubstrate.union(tabs)
         return cuts
 
+    def _buildTabsParallel(self, fillet: KiLength, workers: int) \
+            -> List[Tuple[List[Polygon], List[LineString]]]:
+        """
+        Build tabs for all substrates in a process pool. Return a list of tabs
+        and cuts for each substrate in the order of substrates.
+
+        Substrates whose revert transformation cannot be passed to another
+        process (e.g., a local function) are built serially meanwhile, so
+        errors still report the source board coordinates.
+        """
+        results = [None] * len(self.substrates)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            serial = []
+            for i, s in enumerate(self.substrates):
+                if not isPicklable(s.revertTransformation):
+                    serial.append(i)
+                    continue
+                # Orient the substrate here, so it is the same as in serial case
+                s.orient()
+                # Annotations might reference KiCAD objects, pass only the values
+                annotations = [TabAnnotation(None, (a.origin[0], a.origin[1]),
+                                             (a.direction[0], a.direction[1]),
+                                             a.width, a.maxLength)
+                               for a in s.annotations]
+                futures[i] = executor.submit(_buildTabsWkb, s.substrates.wkb,
+                    s.partitionLine.wkb, annotations, fillet,
+                    s.revertTransformation)
+            for i in serial:
+                s = self.substrates[i]
+                results[i] = buildTabs(s, s.partitionLine, s.annotations, fillet)
+            for i, future in futures.items():
+                tabs, cuts = future.result()
+                results[i] = ([shapely.wkb.loads(t) for t in tabs],
+                              [shapely.wkb.loads(c) for c in cuts])
+        return results
+
     def _buildTabAnnotationForEdge(self, edge, dir, count, width):
         """
         Given an edge as AxialLine, dir and count, return a list of
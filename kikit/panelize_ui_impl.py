@@ -289,20 +289,24 @@ def buildTabs(preset, panel, substrates, boundarySubstrates):
             panel.buildTabAnnotationsFixed(properties["hcount"],
                 properties["vcount"], properties["hwidth"], properties["vwidth"],
                 properties["mindistance"], boundarySubstrates)
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"],
+                properties["workers"])
         if type == "spacing":
             panel.clearTabsAnnotations()
             panel.buildTabAnnotationsSpacing(properties["spacing"],
                 properties["hwidth"], properties["vwidth"], boundarySubstrates)
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"],
+                properties["workers"])
         if type == "corner":
             panel.clearTabsAnnotations()
             panel.buildTabAnnotationsCorners(properties["width"])
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"],
+                properties["workers"])
         if type == "full":
             return panel.buildFullTabs(properties["cutout"], properties["patchcorners"])
         if type == "annotation":
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"],
+                properties["workers"])
         if type == "plugin":
             pluginInst = properties["code"](preset, properties["arg"])
             return pluginInst.buildTabs(panel)
@@ -386,6 +386,10 @@ TABS_SECTION = {
         typeIn(["fixed", "spacing", "corner", "annotation", "plugin"]),
         "Specify tab fillet radius (experimental)"
     ),
+    "workers": SNaturalNum(
+        typeIn(["fixed", "spacing", "corner", "annotation"]),
+        "Number of processes used to build the tabs. 1 builds them serially."
+    ),
     "code": SPlugin(
         plugin.TabsPlugin,
         typeIn(["plugin"]),
@@ -1,5 +1,10 @@
 from io import StringIO
-from typing import Callable, Dict, Iterable, Optional, Union
+from typing import BinaryIO, Callable, Dict, Iterable, Optional, Tuple, Union
+import gc
+import os
+import re
+import shutil
+from sys import intern
 
 # Simple white-space aware S-Expression parser (parsing and dumping yields the
 # same result). Might not support all features of S-expression, but should be
@@ -40,6 +45,8 @@ class Stream:
 
 
 class Atom:
+    __slots__ = ("value", "quoted", "leadingWhitespace")
+
     def __init__(self, value, leadingWhitespace="", quoted=False):
         self.value = value
         self.quoted = quoted
@@ -59,6 +66,9 @@ class Atom:
         return self.value == o.value and self.leadingWhitespace == o.leadingWhitespace
 
 class SExpr:
+    __slots__ = ("items", "leadingWhitespace", "trailingWhitespace", "complete",
+                 "trailingOuterWhitespace")
+
     def __init__(self, items=None, leadingWhitespace="", trailingWhitespace="", complete=True):
         if items is None:
             self.items = []
@@ -70,13 +80,45 @@ class SExpr:
         self.trailingOuterWhitespace = ""
 
     def __str__(self):
+        out = StringIO()
+        self.write(out)
+        return out.getvalue()
+
+    def write(self, out) -> None:
+        """
+        Serialize the expression into a text stream. The tree is traversed
+        iteratively, so deeply nested expressions are not an issue.
+        """
         # TBA: we should validate that two atoms do not get squished together
         # as they have wrongly specified whitespace
-        return (self.leadingWhitespace + "("
-            + "".join([str(x) for x in self.items])
-            + self.trailingWhitespace
-            + (")" if self.complete else "")
-            + self.trailingOuterWhitespace)
+        write = out.write
+        write(self.leadingWhitespace)
+        write("(")
+        stack = [(self, iter(self.items))]
+        while stack:
+            expr, children = stack[-1]
+            for item in children:
+                if isinstance(item, Atom):
+                    write(item.leadingWhitespace)
+                    if item.quoted:
+                        write('"')
+                        write(item.value)
+                        write('"')
+                    else:
+                        write(item.value)
+                elif isinstance(item, LazySExpr) and not item.parsed:
+                    write(str(item))
+                else:
+                    write(item.leadingWhitespace)
+                    write("(")
+                    stack.append((item, iter(item.items)))
+                    break
+            else:
+                stack.pop()
+                write(expr.trailingWhitespace)
+                if expr.complete:
+                    write(")")
+                write(expr.trailingOuterWhitespace)
 
     def __repr__(self):
         val = [x.__repr__() for x in self.items]
@@ -97,9 +139,85 @@ class SExpr:
     def __len__(self):
         return self.items.__len__()
 
+    @property
+    def name(self) -> Optional[str]:
+        """
+        The value of the first item if it is an atom, otherwise None
+        """
+        if len(self.items) == 0 or not isinstance(self.items[0], Atom):
+            return None
+        return self.items[0].value
+
+class LazySExpr(SExpr):
+    """
+    S-expression that keeps only its name and its range in the source text
+    until its content is accessed. Then, the whole subtree is parsed.
+    """
+    __slots__ = ("_text", "_start", "_end", "_name", "_expr")
+
+    def __init__(self, text, start, end, name, leadingWhitespace=""):
+        self._text = text
+        self._start = start
+        self._end = end
+        self._name = name
+        self._expr = None
+        self.leadingWhitespace = leadingWhitespace
+        self.complete = True
+        self.trailingOuterWhitespace = ""
+
+    def _content(self) -> SExpr:
+        if self._expr is None:
+            self._expr = parseSexprT(self._text, self._start)
+            self._text = None
+        return self._expr
+
+    @property
+    def parsed(self) -> bool:
+        return self._expr is not None
+
+    def materialize(self) -> SExpr:
+        """
+        Parse the content and return it as a regular SExpr, e.g., to pickle it
+        """
+        expr = self._content()
+        expr.leadingWhitespace = self.leadingWhitespace
+        expr.trailingOuterWhitespace = self.trailingOuterWhitespace
+        return expr
+
+    @property
+    def items(self):
+        return self._content().items
+
+    @items.setter
+    def items(self, value):
+        self._content().items = value
+
+    @property
+    def trailingWhitespace(self):
+        return self._content().trailingWhitespace
+
+    @trailingWhitespace.setter
+    def trailingWhitespace(self, value):
+        self._content().trailingWhitespace = value
+
+    @property
+    def name(self) -> Optional[str]:
+        if self._expr is None:
+            return self._name
+        return super().name
+
+    def __str__(self):
+        if self._expr is None:
+            return (self.leadingWhitespace
+                + self._text[self._start:self._end]
+                + self.trailingOuterWhitespace)
+        return super().__str__()
+
+
+ATOM_END = frozenset("()")
 
 def atomEnd(c):
-    return c.isspace() or c in set("()")
+    return c.isspace() or c in ATOM_END
 
 def readQuotedString(stream):
     stream.shift('"')
@@ -178,16 +296,263 @@ def readSexpr(stream, limit=None):
         expr.complete = False
     return expr
 
-def parseSexprF(sourceStream, limit=None):
-    stream = Stream(sourceStream)
-    lw = readWhitespace(stream)
-    s = readSexpr(stream, limit=limit)
-    s.leadingWhitespace = lw
-    s.trailingOuterWhitespace = readWhitespace(stream)
-    return s
+# The character-level readers above are kept for reading from streams. The
+# parsing functions below tokenize the whole text at once with a regular
+# expression, which is significantly faster for large files. The groups of a
+# token are: leading whitespace, opening paren, closing paren, quoted string
+# (with escapes kept verbatim) and a plain atom.
+_WHITESPACE = re.compile(r"\s*")
+_TOKEN = re.compile(r"""(\s*)(?:(\()|(\))|"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s()"][^\s()]*))""",
+                    re.DOTALL)
+
+# Matches a run of whitespace, plain atoms and quoted strings
+_NON_PARENS = re.compile(r"""(?:\s+|[^\s()"][^\s()]*|"[^"\\]*(?:\\.[^"\\]*)*")*""",
+                         re.DOTALL)
+
+def _unexpected(text, pos):
+    if pos >= len(text):
+        return ParseError("Unexpected end of input")
+    return ParseError(f"Unexpected input at position {pos}: {repr(text[pos:pos + 20])}")
+
+def skipSexpr(text, pos):
+    """
+    Given a position of an opening paren, find the end of the S-expression by
+    scanning for the balanced closing paren. Return the position after it.
+    """
+    if not text.startswith("(", pos):
+        raise _unexpected(text, pos)
+    depth = 0
+    nonParens = _NON_PARENS.match
+    while True:
+        c = text[pos:pos + 1]
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        else:
+            raise _unexpected(text, pos)
+        pos = nonParens(text, pos + 1).end()
 
-def parseSexprS(s, limit=None):
-    return parseSexprF(StringIO(s), limit=limit)
+def parseSexprT(text, pos=0, limit=None, lazy=False):
+    """
+    Parse an S-Expression from a string starting at given position. You can
+    optionally try to parse only the first n nodes by specifying limit; the
+    rest of the text is kept as the trailing whitespace of the expression.
+
+    When lazy is specified, the top-level child expressions are only delimited
+    and they are parsed once their content is accessed (see LazySExpr).
+    """
+    match = _WHITESPACE.match(text, pos)
+    leadingWhitespace = match.group()
+    pos = match.end()
+    if not text.startswith("(", pos):
+        raise ParseError(f"Expected '(', got {repr(text[pos:pos + 1])}")
+    pos += 1
+
+    root = SExpr(leadingWhitespace=leadingWhitespace)
+    # The parser allocates a lot of objects that are never garbage, so
+    # suspend the cyclic garbage collector which would scan them repeatedly
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        pos = _parseItems(text, pos, root, limit, lazy)
+    finally:
+        if gcEnabled:
+            gc.enable()
+    if not root.complete:
+        root.trailingWhitespace = text[pos:]
+        return root
+    root.trailingOuterWhitespace = _WHITESPACE.match(text, pos).group()
+    return root
+
+def _parseItems(text, pos, root, limit, lazy):
+    """
+    Parse items of root starting at pos until its closing paren or until limit
+    top-level items are read. Return the position after the last token.
+    """
+    stack = [root]
+    items = root.items
+    tokenMatch = _TOKEN.match
+    # Plain atoms (numbers, flags) and whitespace repeat a lot in KiCAD files,
+    # so share a single string instance for equal values. Node names are
+    # interned globally.
+    strings = {}
+    share = strings.setdefault
+    while limit is None or limit > 0 or len(stack) > 1:
+        match = tokenMatch(text, pos)
+        if match is None:
+            raise _unexpected(text, pos + len(_WHITESPACE.match(text, pos).group()))
+        pos = match.end()
+        whitespace, opening, closing, quoted, plain = match.groups()
+        if len(whitespace) > 1:
+            whitespace = share(whitespace, whitespace)
+        if plain is not None:
+            plain = intern(plain) if not items else share(plain, plain)
+            items.append(Atom(plain, whitespace))
+        elif opening is not None and lazy and len(stack) == 1:
+            start = pos - 1
+            nameMatch = tokenMatch(text, pos)
+            name = None
+            if nameMatch is not None:
+                name = nameMatch.group(5) or nameMatch.group(4)
+            pos = skipSexpr(text, start)
+            items.append(LazySExpr(text, start, pos, name, whitespace))
+        elif opening is not None:
+            expr = SExpr(leadingWhitespace=whitespace)
+            items.append(expr)
+            stack.append(expr)
+            items = expr.items
+            continue
+        elif quoted is not None:
+            items.append(Atom(quoted, whitespace, quoted=True))
+        else:
+            stack.pop().trailingWhitespace = whitespace
+            if not stack:
+                return pos
+            items = stack[-1].items
+        if limit is not None and len(stack) == 1:
+            limit -= 1
+    root.complete = False
+    return pos
+
+def parseSexprF(sourceStream, limit=None, lazy=False):
+    return parseSexprT(sourceStream.read(), limit=limit, lazy=lazy)
+
+def parseSexprS(s, limit=None, lazy=False):
+    return parseSexprT(s, limit=limit, lazy=lazy)
+
+# Header patching: locate a top-level node of a (possibly huge) file without
+# parsing it and replace it while streaming the rest of the file.
+
+_SPECIAL = re.compile(rb'[()"]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_NODE_NAME = re.compile(rb'[^\s()"]*')
+
+def locateTopLevelNode(stream: BinaryIO, names: Iterable[str],
+                       limit: Optional[int]=None,
+                       blockSize: int=1 << 16) -> Optional[Tuple[int, int]]:
+    """
+    Scan a binary stream containing an S-expression and find the first
+    top-level child node whose name is one of names. Only the beginning of the
+    stream up to the node is read in blocks of blockSize; the scanned data are
+    not kept in memory. You can optionally scan only the first n top-level
+    nodes by specifying limit.
+
+    Returns the byte range (start, end) of the node in the stream or None.
+    """
+    encodedNames = set(n.encode("utf-8") for n in names)
+    buffer = b""
+    offset = 0 # Stream offset of buffer[0]
+    pos = 0 # Scanning position in the buffer
+    eof = False
+    depth = 0
+    inString = False
+    children = 0
+    nodeStart: Optional[int] = None
+
+    while True:
+        pattern = _STRING_SPECIAL if inString else _SPECIAL
+        match = pattern.search(buffer, pos)
+        # We need a few more bytes to handle escapes and node names
+        needsMore = match is None or \
+            (match.group() in (b"\\", b"(") and
+             _NODE_NAME.match(buffer, match.end()).end() == len(buffer))
+        if needsMore and not eof:
+            pos = len(buffer) if match is None else match.start()
+            if nodeStart is None:
+                # Discard the scanned data
+                offset += pos
+                buffer = buffer[pos:]
+                pos = 0
+            block = stream.read(blockSize)
+            eof = len(block) == 0
+            buffer += block
+            continue
+        if match is None:
+            return None
+        c = match.group()
+        i = match.start()
+        pos = match.end()
+        if inString:
+            if c == b"\\":
+                pos += 1 # Skip the escaped character
+            else:
+                inString = False
+        elif c == b'"':
+            inString = True
+        elif c == b"(":
+            depth += 1
+            if depth == 2 and nodeStart is None:
+                children += 1
+                if limit is not None and children > limit:
+                    return None
+                if _NODE_NAME.match(buffer, pos).group() in encodedNames:
+                    nodeStart = i
+        else:
+            depth -= 1
+            if depth == 1 and nodeStart is not None:
+                return offset + nodeStart, offset + pos
+            if depth <= 0:
+                return None
+
+def readTopLevelNode(filename: str, names: Iterable[str],
+                     limit: Optional[int]=None) -> Optional[SExpr]:
+    """
+    Parse the first top-level node of the file whose name is one of names. See
+    locateTopLevelNode.
+    """
+    with open(filename, "rb") as f:
+        span = locateTopLevelNode(f, names, limit)
+        if span is None:
+            return None
+        f.seek(span[0])
+        return parseSexprS(f.read(span[1] - span[0]).decode("utf-8"))
+
+def _copyBytes(source: BinaryIO, target: BinaryIO, count: int,
+               blockSize: int=1 << 20) -> None:
+    while count > 0:
+        block = source.read(min(count, blockSize))
+        if len(block) == 0:
+            raise IOError("Unexpected end of file")
+        target.write(block)
+        count -= len(block)
+
+def replaceTopLevelNode(filename: str, names: Iterable[str], replacement: str,
+                        limit: Optional[int]=None) -> int:
+    """
+    Replace the first top-level node of the file whose name is one of names by
+    the string replacement. When the length of the node does not change, the
+    file is rewritten in place. Otherwise, a new file is written, with the rest
+    of the original file streamed in large blocks, and it replaces the original
+    one. Returns the number of bytes written.
+    """
+    data = replacement.encode("utf-8")
+    with open(filename, "r+b") as f:
+        span = locateTopLevelNode(f, names, limit)
+        if span is None:
+            raise ParseError(f"No node {', '.join(names)} found in {filename}")
+        start, end = span
+        if end - start == len(data):
+            f.seek(start)
+            f.write(data)
+            return len(data)
+        patchedFilename = filename + ".kikit-tmp"
+        try:
+            with open(patchedFilename, "wb") as target:
+                f.seek(0)
+                _copyBytes(f, target, start)
+                target.write(data)
+                f.seek(end)
+                shutil.copyfileobj(f, target, 1 << 20)
+            shutil.copymode(filename, patchedFilename)
+        except BaseException:
+            if os.path.exists(patchedFilename):
+                os.remove(patchedFilename)
+            raise
+    os.replace(patchedFilename, filename)
+    return os.path.getsize(filename)
 
 
 AstNode = Union[SExpr, Atom]
@@ -225,11 +590,6 @@ def findNode(nodes: Iterable[AstNode], name: str) -> Optional[SExpr]:
     Finds a node with given name in a list of nodes
     """
     for node in nodes:
-        if isinstance(node, Atom):
-            continue
-        if len(node.items) == 0:
-            continue
-        nameNode = node.items[0]
-        if isinstance(nameNode, Atom) and nameNode.value == name:
+        if isinstance(node, SExpr) and node.name == name:
             return node
     return None
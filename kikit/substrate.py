@@ -1,21 +1,23 @@
 from shapely import geometry
 from shapely.geometry import (Polygon, MultiPolygon, LineString,
-    MultiLineString, LinearRing, Point)
+    MultiLineString, LinearRing, Point, box)
 from shapely.geometry.collection import GeometryCollection
 from shapely.ops import orient, unary_union, split, nearest_points
 import shapely
+from shapely.prepared import prep
+from shapely.strtree import STRtree
 import json
 import numpy as np
 from kikit.intervals import Interval, BoxNeighbors, BoxPartitionLines
 from pcbnewTransition import pcbnew
 from enum import IntEnum
-from itertools import product
 
 from typing import List, Tuple, Union
 
 from kikit.common import *
 from kikit.units import deg
 from kikit.defs import STROKE_T, Layer
+from kikit.transformation import AffineTransformation
 
 TABFAIL_VISUAL = False
 
@@ -57,31 +59,38 @@ def getEndPoint(geom):
         point = geom.GetEnd()
     return point
 
-class CoincidenceList(list):
-    def getNeighbor(self, myIdx):
-        if self[0] == myIdx:
-            return self[1]
-        return self[0]
-
-def getUnused(usageList):
-    return usageList.index(True)
+def getEndPoints(geometryList, precision=-4):
+    """
+    Read start and end points of all PCB_SHAPE entities into two (N, 2) integer
+    arrays rounded the same way as roundPoint does.
+    """
+    starts = np.empty((len(geometryList), 2), dtype=np.int64)
+    ends = np.empty((len(geometryList), 2), dtype=np.int64)
+    for i, geom in enumerate(geometryList):
+        start, end = getStartPoint(geom), getEndPoint(geom)
+        starts[i] = (start[0], start[1])
+        ends[i] = (end[0], end[1])
+    return np.round(starts, precision), np.round(ends, precision)
 
-def findRing(startIdx, geometryList, coincidencePoints, unused):
+def findRing(startIdx, startIds, endIds, pointEdges, unused):
     """
-    Find a geometry ring starting at given element, returns it as a list of indices
+    Find a geometry ring starting at given element, returns it as a list of
+    indices. The points are given as ids of start and end points of each
+    element; pointEdges lists the two elements sharing each point.
     """
     unused[startIdx] = False
     ring = [startIdx]
-    if roundPoint(getStartPoint(geometryList[startIdx])) == roundPoint(getEndPoint(geometryList[startIdx])):
+    if startIds[startIdx] == endIds[startIdx]:
         return ring
-    currentPoint = roundPoint(getEndPoint(geometryList[startIdx]))
+    currentPoint = endIds[startIdx]
     while True:
-        nextIdx = coincidencePoints[currentPoint].getNeighbor(ring[-1])
+        a, b = pointEdges[currentPoint]
+        nextIdx = b if a == ring[-1] else a
         assert(unused[nextIdx] or nextIdx == startIdx)
-        if currentPoint == roundPoint(getStartPoint(geometryList[nextIdx])):
-            currentPoint = roundPoint(getEndPoint(geometryList[nextIdx]))
+        if currentPoint == startIds[nextIdx]:
+            currentPoint = endIds[nextIdx]
         else:
-            currentPoint = roundPoint(getStartPoint(geometryList[nextIdx]))
+            currentPoint = startIds[nextIdx]
         unused[nextIdx] = False
         if nextIdx == startIdx:
             return ring
@@ -100,18 +109,20 @@ def extractRings(geometryList):
     Walks a list of PCB_SHAPE entities and produces a list of continuous rings
     returned as list of list of indices from the geometryList.
     """
-    coincidencePoints = {}
-    invalidGeometry = []
-    for i, geom in enumerate(geometryList):
-        if not isValidPcbShape(geom):
-            invalidGeometry.append(i)
-            continue
-        start = roundPoint(getStartPoint(geom))
-        coincidencePoints.setdefault(start, CoincidenceList()).append(i)
-        end = roundPoint(getEndPoint(geom))
-        coincidencePoints.setdefault(end, CoincidenceList()).append(i)
-    for point, items in coincidencePoints.items():
-        l = len(items)
+    validIdx = np.array([i for i, geom in enumerate(geometryList) if isValidPcbShape(geom)],
+                        dtype=np.int64)
+    starts, ends = getEndPoints([geometryList[i] for i in validIdx])
+    # Identify coincident points; interleave start and end points so the
+    # points are ordered by their first appearance
+    points = np.empty((2 * len(validIdx), 2), dtype=np.int64)
+    points[0::2] = starts
+    points[1::2] = ends
+    uniquePoints, firstOccurrence, pointIds, counts = np.unique(points, axis=0,
+        return_index=True, return_inverse=True, return_counts=True)
+    pointIds = pointIds.reshape(-1)
+    for p in np.argsort(firstOccurrence, kind="stable"):
+        l = counts[p]
+        point = (int(uniquePoints[p][0]), int(uniquePoints[p][1]))
         if l == 1:
             raise PositionError("Discontinuous outline at [{}, {}]. This may have several causes:\n" +
                                 "    - The outline in really discontinuous. Check the coordinates in your source board.\n" +
@@ -122,13 +133,25 @@ def extractRings(geometryList):
             continue
         raise PositionError("Multiple outlines ({}) at [{{}}, {{}}]".format(l), point)
 
+    # Every point is shared by exactly two elements
+    elementIds = np.repeat(validIdx, 2)
+    pointEdges = elementIds[np.argsort(pointIds, kind="stable")].reshape(-1, 2).tolist()
+    startIds = [None] * len(geometryList)
+    endIds = [None] * len(geometryList)
+    unused = [False] * len(geometryList)
+    for i, startId, endId in zip(validIdx.tolist(), pointIds[0::2].tolist(), pointIds[1::2].tolist()):
+        startIds[i] = startId
+        endIds[i] = endId
+        unused[i] = True
+
     rings = []
-    unused = [True] * len(geometryList)
-    for invalidIdx in invalidGeometry:
-        unused[invalidIdx] = False
-    while any(unused):
-        start = getUnused(unused)
-        rings.append(findRing(start, geometryList, coincidencePoints, unused))
+    nextUnused = 0
+    while True:
+        while nextUnused < len(unused) and not unused[nextUnused]:
+            nextUnused += 1
+        if nextUnused == len(unused):
+            break
+        rings.append(findRing(nextUnused, startIds, endIds, pointEdges, unused))
     return rings
 
 def commonEndPoint(a, b):
@@ -143,7 +166,8 @@ def commonEndPoint(a, b):
 
 def approximateArc(arc, endWith):
     """
-    Take DRAWINGITEM and approximate it using lines
+    Take DRAWINGITEM and approximate it using lines. Return an (N, 2) array of
+    points.
     """
     SEGMENTS_PER_FULL= 4 * 32 # To Be consistent with default shapely settings
 
@@ -158,57 +182,53 @@ def approximateArc(arc, endWith):
     # Ensure a minimal number of segments for small angle section of arcs
     segments = max(segments, 12)
     theta = np.linspace(startAngle.AsRadians(), endAngle.AsRadians(), segments)
-    x = arc.GetCenter()[0] + arc.GetRadius() * np.cos(theta)
-    y = arc.GetCenter()[1] + arc.GetRadius() * np.sin(theta)
-    outline = list(np.column_stack([x, y]))
-
-    end = np.array(endWith)
-    first = np.array([outline[0][0], outline[0][1]])
-    last = np.array([outline[-1][0], outline[-1][1]])
-    if (np.linalg.norm(end - first) < np.linalg.norm(end - last)):
-        outline.reverse()
-    return outline
+    center = arc.GetCenter()
+    outline = np.column_stack((center[0] + arc.GetRadius() * np.cos(theta),
+                               center[1] + arc.GetRadius() * np.sin(theta)))
+    return orientOutline(outline, endWith)
 
 def approximateBezier(bezier, endWith):
     """
     Take DRAWINGITEM bezier and approximate it using lines.
 
     This is more or less inspired by the KiCAD code as KiCAD does not export
-    the relevant functions
+    the relevant functions. Return an (N, 2) array of points.
     """
     assert bezier.GetShape() == STROKE_T.S_CURVE
 
     CURVE_POINTS = 4 * 32 - 2
     dt = 1.0 / CURVE_POINTS
 
-    start = np.array(bezier.GetStart())
+    start = np.array(bezier.GetStart(), dtype=np.float64)
     if hasattr(bezier, "GetBezierC1"):
-      bc1 = np.array(bezier.GetBezierC1())
-      bc2 = np.array(bezier.GetBezierC2())
+      bc1 = np.array(bezier.GetBezierC1(), dtype=np.float64)
+      bc2 = np.array(bezier.GetBezierC2(), dtype=np.float64)
     else:
-      bc1 = np.array(bezier.GetBezControl1())
-      bc2 = np.array(bezier.GetBezControl2())
-    end = np.array(bezier.GetEnd())
+      bc1 = np.array(bezier.GetBezControl1(), dtype=np.float64)
+      bc2 = np.array(bezier.GetBezControl2(), dtype=np.float64)
+    end = np.array(bezier.GetEnd(), dtype=np.float64)
 
     degenerated = (start == bc1).all() and (bc2 == end).all()
 
-    outline = [start]
-    if not degenerated:
-        for i in range(CURVE_POINTS):
-            t = dt * i
-            vertex = (1 - t) ** 3 * start + \
-                     3 * t * (1 - t) ** 2 * bc1 + \
-                     3 * t ** 2 * (1 - t) * bc2 + \
-                     t ** 3 * end
-            outline.append(vertex)
-    outline.append(end)
-
-    endWith = np.array(endWith)
-    first = np.array([outline[0][0], outline[0][1]])
-    last = np.array([outline[-1][0], outline[-1][1]])
-    if (np.linalg.norm(endWith - first) < np.linalg.norm(endWith - last)):
-        outline.reverse()
-
+    if degenerated:
+        outline = np.vstack((start, end))
+    else:
+        t = (dt * np.arange(CURVE_POINTS))[:, np.newaxis]
+        curve = (1 - t) ** 3 * start + \
+                3 * t * (1 - t) ** 2 * bc1 + \
+                3 * t ** 2 * (1 - t) * bc2 + \
+                t ** 3 * end
+        outline = np.vstack((start, curve, end))
+    return orientOutline(outline, endWith)
+
+def orientOutline(outline: np.ndarray, endWith) -> np.ndarray:
+    """
+    Given an (N, 2) array of points, return it oriented so it ends with the
+    point closer to endWith.
+    """
+    endWith = np.array([endWith[0], endWith[1]], dtype=np.float64)
+    if np.linalg.norm(endWith - outline[0]) < np.linalg.norm(endWith - outline[-1]):
+        return np.ascontiguousarray(outline[::-1])
     return outline
 
 def createRectangle(rect):
@@ -253,37 +273,49 @@ def toShapely(ring, geometryList):
     for idxA, idxB in zip(ring, ring[1:] + ring[:1]):
         shape = geometryList[idxA].GetShape()
         if shape in [STROKE_T.S_ARC, STROKE_T.S_CIRCLE]:
-            outline += approximateArc(geometryList[idxA],
-                commonEndPoint(geometryList[idxA], geometryList[idxB]))
+            outline.append(approximateArc(geometryList[idxA],
+                commonEndPoint(geometryList[idxA], geometryList[idxB])))
         elif shape in [STROKE_T.S_CURVE]:
-            outline += approximateBezier(geometryList[idxA],
-                commonEndPoint(geometryList[idxA], geometryList[idxB]))
+            outline.append(approximateBezier(geometryList[idxA],
+                commonEndPoint(geometryList[idxA], geometryList[idxB])))
         elif shape in [STROKE_T.S_RECT]:
-            outline += createRectangle(geometryList[idxA])
+            outline.append(np.array([(p[0], p[1]) for p in createRectangle(geometryList[idxA])],
+                dtype=np.float64))
         elif shape in [STROKE_T.S_POLYGON]:
             # Polygons are always closed, so they should appear as stand-alone
             assert len(ring) in [1, 2]
             return shapePolyToShapely(geometryList[idxA].GetPolyShape())
         elif shape in [STROKE_T.S_SEGMENT]:
-            outline.append(commonEndPoint(geometryList[idxA], geometryList[idxB]))
+            p = commonEndPoint(geometryList[idxA], geometryList[idxB])
+            outline.append(np.array([(p[0], p[1])], dtype=np.float64))
         else:
             raise RuntimeError(f"Unsupported shape {shape} in outline")
-    return Polygon(outline)
+    return Polygon(np.concatenate(outline))
 
 def buildContainmentGraph(polygons):
     """
     Given a list of polygons returns a dictionary a -> [b] representing a
     relation "a contains b". a and b are indices to the original list.
     """
-    # We use the naive algorithm - test all pairs - as the number of polygons is
-    # rather small in a typical scenario
+    # Only the polygons with overlapping bounding boxes are tested for the
+    # relation
     polygonCount = len(polygons)
     relation = {key: [] for key in range(polygonCount)}
-    for a, b in product(range(polygonCount), range(polygonCount)):
-        if a == b:
-            continue
-        if polygons[a].contains(polygons[b]):
-            relation[a].append(b)
+    if polygonCount < 2:
+        return relation
+    tree = STRtree(polygons)
+    indices = {id(polygon): i for i, polygon in enumerate(polygons)}
+    for a, polygon in enumerate(polygons):
+        candidates = tree.query(polygon)
+        # Shapely 1.x returns geometries instead of indices
+        candidates = sorted(c if isinstance(c, (int, np.integer)) else indices[id(c)]
+                            for c in candidates)
+        prepared = prep(polygon)
+        for b in candidates:
+            if a == b:
+                continue
+            if prepared.contains(polygons[b]):
+                relation[a].append(int(b))
     return relation
 
 class DFS(IntEnum):
@@ -444,13 +476,46 @@ def linestringToKicad(linestring):
         lineChain.Append(int(c[0]), int(c[1]))
     return lineChain
 
+def localMill(geometry, bounds, mill, radius: KiLength,
+              maxVertices: int = 10000) -> List[Polygon]:
+    """
+    Apply mill (a function of geometry) locally. The milling of a point may
+    depend only on the geometry within 2 * radius. Split the bounds until the
+    geometry inside them is small and mill each piece clipped with a margin
+    larger than that. Return a list of pieces of the result clipped to disjoint
+    boxes covering the bounds.
+    """
+    minx, miny, maxx, maxy = bounds
+    margin = 3 * radius
+    local = geometry.intersection(box(minx - margin, miny - margin,
+                                      maxx + margin, maxy + margin))
+    if local.is_empty:
+        return []
+    width, height = maxx - minx, maxy - miny
+    if shapely.get_num_coordinates(local) > maxVertices and max(width, height) > 4 * margin:
+        if width > height:
+            halves = [(minx, miny, minx + width / 2, maxy), (minx + width / 2, miny, maxx, maxy)]
+        else:
+            halves = [(minx, miny, maxx, miny + height / 2), (minx, miny + height / 2, maxx, maxy)]
+        return [piece for half in halves
+                      for piece in localMill(local, half, mill, radius, maxVertices)]
+    return [mill(local).intersection(box(minx, miny, maxx, maxy))]
+
 class Substrate:
     """
     Represents (possibly multiple) PCB substrates reconstructed from a list of
     geometry
+
+    When deferUnion is True, geometry appended via union is only queued. All
+    queued geometry is merged in a single union when the substrates are read.
+    This avoids repeated unions with the whole substrate when many pieces are
+    appended one by one.
     """
-    def __init__(self, geometryList, bufferDistance=0, revertTransformation=None):
+    def __init__(self, geometryList, bufferDistance=0, revertTransformation=None,
+                 deferUnion=False):
         polygons = [toShapely(ring, geometryList) for ring in extractRings(geometryList)]
+        self._pendingUnion = []
+        self.deferUnion = deferUnion
         self.substrates = unary_union(substratesFrom(polygons))
         self.oriented = False
         if not self.substrates.is_empty:
@@ -459,6 +524,21 @@ class Substrate:
         self.annotations = []
         self.revertTransformation = revertTransformation
 
+    @property
+    def substrates(self):
+        """
+        Shapely geometry of the substrates
+        """
+        if self._pendingUnion:
+            self._substrates = unary_union([self._substrates] + self._pendingUnion)
+            self._pendingUnion = []
+        return self._substrates
+
+    @substrates.setter
+    def substrates(self, geometry):
+        self._pendingUnion = []
+        self._substrates = geometry
+
     def backToSource(self, point):
         """
         Return a point in the source form (if a reverse transformation was set)
@@ -503,11 +583,15 @@ class Substrate:
         substrate.
         """
         if isinstance(other, list):
-            self.substrates = unary_union([self.substrates] + other)
+            pieces = other
         elif isinstance(other, Substrate):
-            self.substrates = unary_union([self.substrates, other.substrates])
+            pieces = [other.substrates]
         else:
-            self.substrates = unary_union([self.substrates, other])
+            pieces = [other]
+        if self.deferUnion:
+            self._pendingUnion.extend(pieces)
+        else:
+            self.substrates = unary_union([self.substrates] + pieces)
         self.oriented = False
 
     def cut(self, piece):
@@ -699,10 +783,33 @@ class Substrate:
             -> Tuple[Polygon, LineString]:
         if fillet == 0:
             return tab, tabFace
-        joined = self.substrates.union(tab)
+        # The fillet is computed only in a window around the tab. The rounding
+        # of a point depends only on geometry within 2 * fillet, so the result
+        # inside the tab bounding box expanded by 2 * fillet is exact. If the
+        # fillet reaches out of it (e.g., for acute corners), compute it on the
+        # whole substrate.
+        minx, miny, maxx, maxy = tab.bounds
+        innerWindow = box(minx - 2 * fillet, miny - 2 * fillet,
+                          maxx + 2 * fillet, maxy + 2 * fillet)
+        window = box(minx - 4 * fillet, miny - 4 * fillet,
+                     maxx + 4 * fillet, maxy + 4 * fillet)
+        try:
+            localSubstrate = self.substrates.intersection(window)
+            filletTab, newFace = self._computeTabFillet(localSubstrate, tab,
+                tabFace, fillet)
+            if not filletTab.intersects(innerWindow.exterior):
+                return filletTab, newFace
+        except TabFilletError:
+            pass
+        return self._computeTabFillet(self.substrates, tab, tabFace, fillet)
+
+    @staticmethod
+    def _computeTabFillet(substrates, tab: Polygon, tabFace: LineString,
+                          fillet: KiLength) -> Tuple[Polygon, LineString]:
+        joined = substrates.union(tab)
         RESOLUTION = 64
         rounded = joined.buffer(fillet, resolution=RESOLUTION).buffer(-fillet, resolution=RESOLUTION)
-        remainder = rounded.difference(self.substrates,)
+        remainder = rounded.difference(substrates)
 
         if isinstance(remainder, MultiPolygon) or isinstance(remainder, GeometryCollection):
             geoms = remainder.geoms
@@ -713,7 +820,7 @@ class Substrate:
         candidates = [x for x in geoms if x.intersects(tab)]
         if len(candidates) != 1:
             raise TabFilletError(f"Unexpected number of fillet candidates: {len(candidates)}")
-        newFace = candidates[0].intersection(self.substrates)
+        newFace = candidates[0].intersection(substrates)
         if isinstance(newFace, GeometryCollection):
             newFace = MultiLineString([x for x in newFace.geoms if not isinstance(x, Polygon)])
         if isinstance(newFace, MultiLineString):
@@ -731,20 +838,38 @@ class Substrate:
             msg += f"([{toMm(rp[0])}, {toMm(rp[1])}] in source board)"
         return msg
 
-    def millFillets(self, millRadius):
+    def millFillets(self, millRadius, maxVertices=10000):
         """
         Add fillets to inner corners which will be produced by a mill with
         given radius.
         """
-        EPS = fromMm(0.01)
-        RES = 32
-        if millRadius < EPS:
+        if millRadius < fromMm(0.01):
             return
         self.orient()
-        self.substrates = self.substrates.buffer(millRadius - EPS, resolution=RES) \
-                              .buffer(-millRadius, resolution=RES) \
-                              .buffer(EPS, resolution=RES)
+        if self.substrates.is_empty:
+            return
+        mill = lambda geometry: Substrate._computeMill(geometry, millRadius)
+        if not hasattr(shapely, "get_num_coordinates"):
+            # Shapely 1.x lacks the vectorized operations, process the whole
+            # substrate
+            self.substrates = mill(self.substrates)
+            return
+        # Buffering is superlinear in the number of vertices, mill the
+        # substrate in tiles instead of at once
+        milled = localMill(self.substrates, self.substrates.bounds, mill,
+                           millRadius, maxVertices)
+        self.substrates = unary_union(milled)
 
+    @staticmethod
+    def _computeMill(geometry, millRadius):
+        """
+        Mill the whole geometry at once. This is the reference for millFillets.
+        """
+        EPS = fromMm(0.01)
+        RES = 32
+        return geometry.buffer(millRadius - EPS, resolution=RES) \
+                       .buffer(-millRadius, resolution=RES) \
+                       .buffer(EPS, resolution=RES)
 
     def removeIslands(self):
         """
@@ -783,12 +908,27 @@ class Substrate:
             o = annotation.origin
             annotation.origin = (o[0] + vec[0], o[1] + vec[1])
 
-        def newRevertTransformation(point, orig=self.revertTransformation, vec=vec):
-            prevPoint = (point[0] - vec[0], point[1] - vec[1])
-            if orig is not None:
-                return orig(prevPoint)
-            return prevPoint
-        self.revertTransformation = newRevertTransformation
+        revertTranslation = AffineTransformation.translation((-vec[0], -vec[1]))
+        if self.revertTransformation is None:
+            self.revertTransformation = revertTranslation
+        elif isinstance(self.revertTransformation, AffineTransformation):
+            self.revertTransformation = revertTranslation.then(self.revertTransformation)
+        else:
+            def newRevertTransformation(point, orig=self.revertTransformation):
+                return orig(revertTranslation(point))
+            self.revertTransformation = newRevertTransformation
+
+    def translated(self, vec, revertTransformation=None):
+        """
+        Return a new substrate with the same geometry translated by vec. The
+        geometry is not reconstructed from the board edges. Annotations and
+        partition line are not copied, the new substrate uses the given
+        revertTransformation.
+        """
+        s = Substrate([], revertTransformation=revertTransformation)
+        s.substrates = shapely.affinity.translate(self.substrates, vec[0], vec[1])
+        s.oriented = self.oriented
+        return s
 
 def showPolygon(polygon):
     import matplotlib.pyplot as plt
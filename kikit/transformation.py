@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import Iterable, List, Tuple
+import numpy as np
+
+def kiRound(values: np.ndarray) -> np.ndarray:
+    """
+    Round values to integers the same way KiCAD does (half away from zero)
+    """
+    return np.copysign(np.floor(np.abs(values) + 0.5), values)
+
+def normalizeDegrees(angle: float) -> float:
+    """
+    Normalize angle to [0, 360) the same way EDA_ANGLE::Normalize does
+    """
+    while angle < 0:
+        angle += 360
+    while angle >= 360:
+        angle -= 360
+    return angle
+
+def rotatePoints(points: np.ndarray, angle: float) -> np.ndarray:
+    """
+    Rotate integer points around the origin the same way KiCAD's RotatePoint
+    does; i.e., multiples of 90° are exact, otherwise the result is rounded.
+    """
+    angle = normalizeDegrees(angle)
+    x, y = points[:, 0], points[:, 1]
+    if angle == 0:
+        return points.copy()
+    if angle == 90:
+        return np.column_stack((y, -x))
+    if angle == 180:
+        return np.column_stack((-x, -y))
+    if angle == 270:
+        return np.column_stack((-y, x))
+    sin, cos = np.sin(np.radians(angle)), np.cos(np.radians(angle))
+    return np.column_stack((kiRound(y * sin + x * cos),
+                            kiRound(y * cos - x * sin)))
+
+class AffineTransformation:
+    """
+    2D transformation of points in KiCAD internal units composed of
+    translations and rotations. It gives the same results as transforming a
+    KiCAD object; i.e., before a rotation, the coordinates are truncated to
+    integers and the rotated coordinates are rounded.
+
+    The transformation is stored as a sequence of steps, since KiCAD's rounding
+    prevents us from collapsing it into a single matrix. Consecutive
+    translations are merged.
+    """
+    def __init__(self, steps: Iterable[Tuple] = ()) -> None:
+        self.steps: List[Tuple] = []
+        for step in steps:
+            self._append(step)
+
+    @staticmethod
+    def translation(vec) -> AffineTransformation:
+        """
+        Transformation that moves points by vec
+        """
+        return AffineTransformation([("t", float(vec[0]), float(vec[1]))])
+
+    @staticmethod
+    def rotation(angle: float, origin=(0, 0)) -> AffineTransformation:
+        """
+        Transformation that rotates points by angle (in degrees, KiCAD's
+        orientation) around origin
+        """
+        return AffineTransformation([("r", float(angle), int(origin[0]), int(origin[1]))])
+
+    @staticmethod
+    def truncation() -> AffineTransformation:
+        """
+        Transformation that truncates coordinates to integers the same way as
+        constructing a VECTOR2I from floats does
+        """
+        return AffineTransformation([("i",)])
+
+    def _append(self, step: Tuple) -> None:
+        if step[0] == "t" and self.steps and self.steps[-1][0] == "t":
+            last = self.steps.pop()
+            step = ("t", last[1] + step[1], last[2] + step[2])
+        self.steps.append(step)
+
+    def then(self, other: AffineTransformation) -> AffineTransformation:
+        """
+        Return a transformation that first applies self and then other
+        """
+        return AffineTransformation(self.steps + other.steps)
+
+    def inverse(self) -> AffineTransformation:
+        """
+        Return the inverse transformation. Note that it is exact only up to
+        the rounding of non-right-angle rotations.
+        """
+        steps = []
+        for step in reversed(self.steps):
+            if step[0] == "t":
+                steps.append(("t", -step[1], -step[2]))
+            elif step[0] == "i":
+                steps.append(step)
+            else:
+                steps.append(("r", -step[1], step[2], step[3]))
+        return AffineTransformation(steps)
+
+    def apply(self, points) -> np.ndarray:
+        """
+        Transform an array-like of points of shape (N, 2). Return an array of
+        shape (N, 2).
+        """
+        points = np.array(points, dtype=np.float64).reshape(-1, 2)
+        for step in self.steps:
+            if step[0] == "t":
+                points += (step[1], step[2])
+            elif step[0] == "i":
+                points = np.trunc(points)
+            else:
+                origin = np.array((step[2], step[3]), dtype=np.float64)
+                points = rotatePoints(np.trunc(points) - origin, step[1]) + origin
+        return points
+
+    def __call__(self, point) -> Tuple[float, float]:
+        """
+        Transform a single point
+        """
+        x, y = self.apply([point])[0]
+        return (float(x), float(y))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the legacy (KiCAD 5) schematic reader used for BOM generation.
+The benchmark generates large schematics with many components (optionally
+with long field texts) and extracts the components from them. Run it with
+KiKit on PYTHONPATH, e.g.:
+
+    PYTHONPATH=. python3 scripts/benchmarkEeschema.py
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from kikit.eeschema import extractComponents
+
+HEADER = """EESchema Schematic File Version 4
+EELAYER 30 0
+EELAYER END
+$Descr A3 16535 11693
+encoding utf-8
+Sheet 1 1
+Title "Benchmark"
+Date ""
+Rev ""
+Comp ""
+Comment1 ""
+Comment2 ""
+Comment3 ""
+Comment4 ""
+$EndDescr
+"""
+
+COMPONENT = """$Comp
+L Device:R R{i}
+U 1 1 {u:08X}
+P {x} {y}
+F 0 "R{i}" H {x} {y} 50  0000 L CNN
+F 1 "10k" H {x} {y} 50  0000 L CNN
+F 2 "Resistor_SMD:R_0603_1608Metric" V {x} {y} 50  0001 C CNN
+F 3 "~" H {x} {y} 50  0001 C CNN
+F 4 "C25804" H {x} {y} 50  0001 C CNN "LCSC"
+F 5 "{note}" H {x} {y} 50  0001 C CNN "Note"
+	1    {x} {y}
+	1    0    0    -1
+$EndComp
+"""
+
+def generateSchematic(filename, count, noteLength):
+    note = ("Lorem ipsum dolor sit amet " * (noteLength // 27 + 1))[:noteLength]
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for i in range(count):
+            f.write(COMPONENT.format(i=i + 1, u=0x5F000000 + i,
+                x=1000 + 100 * (i % 100), y=1000 + 100 * (i // 100), note=note))
+        f.write("$EndSCHEMATC\n")
+
+def benchmark(count, noteLength, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.sch")
+        generateSchematic(filename, count, noteLength)
+        size = os.path.getsize(filename)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            components = extractComponents(filename)
+        duration = (time.perf_counter() - start) / repeat
+        assert len(components) == count
+    print(f"{count:>7} components, {noteLength:>6} B notes {size / 1000:10.0f} kB "
+          f"{1000 * duration:10.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000],
+        help="Numbers of components to benchmark")
+    parser.add_argument("--notes", type=int, nargs="+", default=[10, 10000],
+        help="Lengths of a long text field of each component")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for noteLength in args.notes:
+        for count in args.counts:
+            benchmark(count, noteLength, args.repeat)
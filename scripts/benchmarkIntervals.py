@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmarks of the box neighbor and partition line queries used when
+building frames, backbones and tabs of panels with many boards. Run it with
+KiKit on PYTHONPATH, e.g.:
+
+    PYTHONPATH=. python3 scripts/benchmarkIntervals.py
+"""
+
+import argparse
+import random
+import time
+from kikit.intervals import BoxNeighbors, Interval, IntervalList
+
+def measure(name, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    duration = (time.perf_counter() - start) / repeat
+    print(f"{name:<40} {1000 * duration:10.2f} ms")
+    return result
+
+def staggeredBoxes(count, seed=0):
+    """
+    Return a dictionary of count non-overlapping boxes of random size placed
+    in a grid with random offsets.
+    """
+    rnd = random.Random(seed)
+    cols = int(count ** 0.5) + 1
+    boxes = {}
+    for i in range(count):
+        x = 10 * (i % cols) + rnd.uniform(0, 3)
+        y = 10 * (i // cols) + rnd.uniform(0, 3)
+        boxes[i] = (x, y, x + rnd.uniform(1, 7), y + rnd.uniform(1, 7))
+    return boxes
+
+def naiveQuery(list):
+    """
+    Reference implementation comparing each box with all the farther ones
+    """
+    neighbors = {}
+    for i, (ident, interval, pos) in enumerate(list):
+        n = []
+        rest = IntervalList([interval])
+        for nIdent, nInterval, nPos in list[i + 1:]:
+            shadow = rest.intersect(nInterval)
+            if shadow.trivial():
+                continue
+            n.append((nIdent, shadow))
+            rest = rest.difference(nInterval)
+            if rest.trivial():
+                break
+        neighbors[ident] = n
+    return neighbors
+
+def gridBoxes(count, size=5, space=2):
+    """
+    Return a dictionary of count equal boxes arranged in a square grid
+    """
+    cols = int(count ** 0.5)
+    boxes = {}
+    for i in range(count):
+        x, y = (i % cols) * (size + space), (i // cols) * (size + space)
+        boxes[i] = (x, y, x + size, y + size)
+    return boxes
+
+def benchmarkNeighbors(count, repeat, naive):
+    boxes = staggeredBoxes(count)
+    measure(f"BoxNeighbors ({count} boxes)", lambda: BoxNeighbors(boxes), repeat)
+    if not naive:
+        return
+    rightList = BoxNeighbors._prepareProjection(
+        lambda b: Interval(b[1], b[3]), lambda b: b[0], boxes)
+    expected = measure(f"naive right query ({count} boxes)",
+        lambda: naiveQuery(rightList), 1)
+    assert BoxNeighbors._computeQuery(rightList) == expected
+
+def benchmarkPartition(count, repeat):
+    # BoxPartitionLines depends on KiCAD via kikit.common
+    from kikit.intervals import BoxPartitionLines
+    boxes = gridBoxes(count)
+    measure(f"BoxPartitionLines ({count} boxes grid)",
+        lambda: BoxPartitionLines(boxes), repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000],
+        help="Numbers of boxes to benchmark")
+    parser.add_argument("--grids", type=int, nargs="+", default=[400, 1600],
+        help="Numbers of boxes of the partition line benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--naive", action="store_true",
+        help="Compare with the pairwise reference implementation")
+    args = parser.parse_args()
+
+    for count in args.counts:
+        benchmarkNeighbors(count, args.repeat, args.naive)
+    for count in args.grids:
+        benchmarkPartition(count, args.repeat)
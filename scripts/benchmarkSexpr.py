@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the S-expression parser on the KiCAD files from the test
+resources. Besides the files as they are, the benchmark also parses boards
+obtained by replicating the body of the largest file to simulate big panels.
+Run it with KiKit on PYTHONPATH, e.g.:
+
+    PYTHONPATH=. python3 scripts/benchmarkSexpr.py
+"""
+
+import argparse
+import glob
+import os
+import time
+from io import StringIO
+from kikit.sexpr import Stream, parseSexprS, readSexpr, readWhitespace
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "..", "test", "resources")
+
+def measure(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+def parseCharByChar(text):
+    """
+    Reference parser reading the input one character at a time
+    """
+    stream = Stream(StringIO(text))
+    lw = readWhitespace(stream)
+    s = readSexpr(stream)
+    s.leadingWhitespace = lw
+    s.trailingOuterWhitespace = readWhitespace(stream)
+    return s
+
+def replicate(text, times):
+    """
+    Make the text larger by repeating everything between the first line and
+    the final closing paren
+    """
+    head, _, body = text.partition("\n")
+    body, _, tail = body.rpartition(")")
+    return head + "\n" + body * times + ")" + tail
+
+def benchmark(name, text, repeat):
+    reference, referenceTime = measure(lambda: parseCharByChar(text), repeat)
+    result, time = measure(lambda: parseSexprS(text), repeat)
+    lazyResult, lazyTime = measure(lambda: parseSexprS(text, lazy=True), repeat)
+    assert str(result) == str(reference) == str(lazyResult) == text
+    print(f"{name:<50} {len(text) / 1000:8.0f} kB "
+          f"{1000 * referenceTime:10.1f} ms {1000 * time:10.1f} ms "
+          f"{referenceTime / time:6.1f}x {1000 * lazyTime:10.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100],
+        help="Replication factors of the largest resource file")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':<50} {'size':>11} {'char-by-char':>13} {'tokenizer':>13} {'':>7}{'lazy':>10}")
+    files = sorted(glob.glob(os.path.join(RESOURCES, "**", "*.kicad_pcb"), recursive=True) +
+                   glob.glob(os.path.join(RESOURCES, "**", "*.kicad_sch"), recursive=True))
+    texts = {}
+    for filename in files:
+        with open(filename, encoding="utf-8") as f:
+            texts[os.path.relpath(filename, RESOURCES)] = f.read()
+    for name, text in texts.items():
+        benchmark(name, text, args.repeat)
+    largest = max(texts, key=lambda name: len(texts[name]))
+    for scale in args.scales:
+        benchmark(f"{largest} x{scale}", replicate(texts[largest], scale), 1)
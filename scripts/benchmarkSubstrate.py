@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmarks of substrate reconstruction from board outlines. Run it with
+KiKit on PYTHONPATH, e.g.:
+
+    PYTHONPATH=. python3 scripts/benchmarkSubstrate.py
+"""
+
+import argparse
+import time
+from pcbnewTransition import pcbnew
+from kikit.common import fromMm, toKiCADPoint
+from kikit.defs import STROKE_T
+from kikit.substrate import (Substrate, approximateArc, getEndPoint,
+    buildContainmentGraph)
+from shapely.geometry import box
+
+def segment(a, b):
+    s = pcbnew.PCB_SHAPE()
+    s.SetShape(STROKE_T.S_SEGMENT)
+    s.SetStart(toKiCADPoint(a))
+    s.SetEnd(toKiCADPoint(b))
+    return s
+
+def arc(a, mid, b):
+    s = pcbnew.PCB_SHAPE()
+    s.SetShape(STROKE_T.S_ARC)
+    s.SetArcGeometry(toKiCADPoint(a), toKiCADPoint(mid), toKiCADPoint(b))
+    return s
+
+def roundedRectangle(x, y, w, h, r):
+    """
+    Return a list of segments and arcs forming a rectangle with rounded corners
+    """
+    c = r - r / 2 ** 0.5 # Inset of the arc midpoint from the bounding corner
+    return [
+        segment((x + r, y), (x + w - r, y)),
+        arc((x + w - r, y), (x + w - c, y + c), (x + w, y + r)),
+        segment((x + w, y + r), (x + w, y + h - r)),
+        arc((x + w, y + h - r), (x + w - c, y + h - c), (x + w - r, y + h)),
+        segment((x + w - r, y + h), (x + r, y + h)),
+        arc((x + r, y + h), (x + c, y + h - c), (x, y + h - r)),
+        segment((x, y + h - r), (x, y + r)),
+        arc((x, y + r), (x + c, y + c), (x + r, y))
+    ]
+
+def roundedGrid(count, size=fromMm(10), space=fromMm(2), radius=fromMm(2)):
+    """
+    Return outline of count rounded rectangles arranged in a grid
+    """
+    cols = int(count ** 0.5) + 1
+    edges = []
+    for i in range(count):
+        x, y = (i % cols) * (size + space), (i // cols) * (size + space)
+        edges += roundedRectangle(x, y, size, size, radius)
+    return edges
+
+def measure(name, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    duration = (time.perf_counter() - start) / repeat
+    print(f"{name:<40} {1000 * duration:10.2f} ms")
+
+def benchmarkArcs(count, repeat):
+    edges = roundedGrid(count)
+    arcs = [e for e in edges if e.GetShape() == STROKE_T.S_ARC]
+    ends = [getEndPoint(a) for a in arcs]
+    measure(f"approximateArc ({len(arcs)} arcs)",
+        lambda: [approximateArc(a, e) for a, e in zip(arcs, ends)], repeat)
+    measure(f"Substrate ({len(edges)} edges)", lambda: Substrate(edges), repeat)
+
+def naiveContainmentGraph(polygons):
+    """
+    Reference implementation testing all pairs of polygons
+    """
+    relation = {key: [] for key in range(len(polygons))}
+    for a in range(len(polygons)):
+        for b in range(len(polygons)):
+            if a != b and polygons[a].contains(polygons[b]):
+                relation[a].append(b)
+    return relation
+
+def benchmarkContainment(count, repeat):
+    """
+    Benchmark containment graph of count boards, each with a single cutout
+    """
+    cols = int(count ** 0.5) + 1
+    polygons = []
+    for i in range(count):
+        x, y = (i % cols) * 12, (i // cols) * 12
+        polygons.append(box(x, y, x + 10, y + 10))
+        polygons.append(box(x + 2, y + 2, x + 8, y + 8))
+    assert buildContainmentGraph(polygons) == naiveContainmentGraph(polygons)
+    measure(f"buildContainmentGraph ({len(polygons)} rings)",
+        lambda: buildContainmentGraph(polygons), repeat)
+    measure(f"naive containment ({len(polygons)} rings)",
+        lambda: naiveContainmentGraph(polygons), 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=250,
+        help="Number of rounded rectangles in the outline")
+    parser.add_argument("--rings", type=int, default=600,
+        help="Number of rings for the containment benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmarkArcs(args.count, args.repeat)
+    benchmarkContainment(args.rings // 2, args.repeat)
@@ -0,0 +1,80 @@
+import shlex
+from io import StringIO
+from kikit.eeschema import (extractComponents, getField, getReference, getUnit,
+                            readEeschemaLine, splitLine)
+
+HEADER = """EESchema Schematic File Version 4
+EELAYER 30 0
+EELAYER END
+$Descr A4 11693 8268
+encoding utf-8
+Sheet {sheet} 3
+Title "Test"
+Date ""
+Rev ""
+Comp ""
+Comment1 ""
+Comment2 ""
+Comment3 ""
+Comment4 ""
+$EndDescr
+"""
+
+COMPONENT = """$Comp
+L Device:R {ref}
+U 1 1 {u}
+P 3000 2000
+AR Path="/5F000001/{u}" Ref="{ref1}"  Part="1"
+AR Path="/5F000002/{u}" Ref="{ref2}"  Part="1"
+F 0 "{ref}" H 3070 2046 50  0000 L CNN
+F 1 "10k" H 3070 1955 50  0000 L CNN
+F 2 "Resistor_SMD:R_0603_1608Metric" V 2930 2000 50  0001 C CNN
+F 3 "~" H 3000 2000 50  0001 C CNN
+F 4 "C25804" H 3000 2000 50  0001 C CNN "LCSC"
+	1    3000 2000
+	1    0    0    -1
+$EndComp
+"""
+
+SHEET = """$Sheet
+S 5000 3000 1000 500
+U {u}
+F0 "Channel" 50
+F1 "channel.sch" 50
+$EndSheet
+"""
+
+def writeProject(tmp_path):
+    root = HEADER.format(sheet=1) \
+        + COMPONENT.format(ref="R1", u="5F100001", ref1="R1", ref2="R1") \
+        + SHEET.format(u="5F000001") + SHEET.format(u="5F000002") \
+        + "$EndSCHEMATC\n"
+    channel = HEADER.format(sheet=2) \
+        + COMPONENT.format(ref="R?", u="5F200001", ref1="R2", ref2="R3") \
+        + "$EndSCHEMATC\n"
+    (tmp_path / "root.sch").write_text(root)
+    (tmp_path / "channel.sch").write_text(channel)
+    return str(tmp_path / "root.sch")
+
+def test_extractComponents(tmp_path):
+    components = extractComponents(writeProject(tmp_path))
+    assert [getReference(c) for c in components] == ["R1", "R2", "R3"]
+    assert all(getField(c, "Value") == "10k" for c in components)
+    assert all(getField(c, "LCSC") == "C25804" for c in components)
+    assert all(getUnit(c) == 1 for c in components)
+
+def test_extractComponentsParallel(tmp_path):
+    filename = writeProject(tmp_path)
+    assert extractComponents(filename, workers=2) == extractComponents(filename)
+
+def test_readEeschemaLine():
+    f = StringIO('F 0 "A\nB" H\n  $EndComp\r\nL "x"\n')
+    assert readEeschemaLine(f) == 'F 0 "A\nB" H'
+    assert readEeschemaLine(f) == "$EndComp"
+    assert readEeschemaLine(f) == 'L "x"'
+
+def test_splitLine():
+    for line in ['F 4 "C25804" H 3000 2000 50  0001 C CNN "LCSC"',
+                 'Title ""', 'F 1 "it\'s" H', 'AR Path="/5F000001/5F100001" Ref="R1"',
+                 'F 1 "a \\"b\\"" H', "L it's x'"]:
+        assert splitLine(line) == shlex.split(line)
@@ -0,0 +1,35 @@
+from kikit.eeschema_v6 import collectSymbols, extractComponents, getField, getReference
+
+PROJECTS = [
+    "../resources/assembly_project_1_KiCAD6/assembly_project_1_KiCAD6.kicad_sch",
+    "../resources/assembly_project_1_KiCAD7/assembly_project_1_KiCAD7.kicad_sch"
+]
+
+def test_sheetCache():
+    for project in PROJECTS:
+        cache = {}
+        symbols, _ = collectSymbols(project, cache=cache)
+        # The bottom sheet is instantiated twice, but parsed only once
+        assert len(symbols) == 4
+        assert len(cache) == 3
+        assert len(set(s.path for s in symbols)) == 4
+
+def test_extractComponents():
+    for project in PROJECTS:
+        components = extractComponents(project)
+        references = sorted(getReference(c) for c in components)
+        assert references == ["R1", "R2", "R3", "R4"]
+        for c in components:
+            assert getField(c, "Value") == f"{getReference(c)}_VAL" or \
+                   getField(c, "Value") == "R3/R4_VAL"
+        r3, r4 = [c for c in components if getReference(c) in ["R3", "R4"]]
+        # Instances of the same symbol must not share the overridden fields
+        assert getReference(r3) != getReference(r4)
+
+def test_extractComponentsParallel():
+    for project in PROJECTS:
+        serial = extractComponents(project)
+        parallel = extractComponents(project, workers=2)
+        assert [s.path for s in serial] == [s.path for s in parallel]
+        assert [dict(s.properties) for s in serial] == \
+               [dict(s.properties) for s in parallel]
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import kikit.export as export
+from kikit.export import (exportSettingsJlcpcb, exportSettingsPcbway,
+                          fullGerberPlotPlan, gerberPlotLayers, plotGerberLayers,
+                          plotGerberLayersParallel)
+
+class FakePlotController:
+    """
+    Mimics PLOT_CONTROLLER, the plot file names are derived from the layer
+    suffix and the plotted layers are recorded.
+    """
+    def __init__(self, plotDir, plotted):
+        self.plotDir = plotDir
+        self.plotted = plotted
+        self.options = SimpleNamespace(SetSkipPlotNPTH_Pads=lambda skip: None)
+        self.fileName = ""
+
+    def GetPlotOptions(self):
+        return self.options
+
+    def SetLayer(self, id):
+        self.layer = id
+
+    def OpenPlotfile(self, suffix, format, comment):
+        self.fileName = os.path.join(self.plotDir, f"board-{suffix}.gbr")
+
+    def GetPlotFileName(self):
+        return self.fileName
+
+    def PlotLayer(self):
+        self.plotted.append(self.layer)
+        return True
+
+    def ClosePlot(self):
+        pass
+
+def fakeBoard(copperLayers):
+    return SimpleNamespace(
+        GetCopperLayerCount=lambda: copperLayers,
+        GetDesignSettings=lambda: SimpleNamespace(GetAuxOrigin=lambda: None))
+
+def patchPlotting(monkeypatch, plotted):
+    # Threads instead of processes, so the workers see the fakes
+    monkeypatch.setattr(export, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(export, "LoadBoard", lambda filename: fakeBoard(4))
+    monkeypatch.setattr(export, "createGerberPlotController",
+        lambda board, plotDir, settings: FakePlotController(plotDir, plotted))
+
+def test_gerberPlotLayers():
+    layers = gerberPlotLayers(fakeBoard(4), fullGerberPlotPlan, exportSettingsJlcpcb)
+    assert layers == fullGerberPlotPlan + [("inner1", 1, "inner"), ("inner2", 2, "inner")]
+
+    layers = gerberPlotLayers(fakeBoard(2), fullGerberPlotPlan, exportSettingsPcbway)
+    assert layers == [("", id, comment) for _, id, comment in fullGerberPlotPlan]
+
+    plan = [p for p in fullGerberPlotPlan if p[1] not in [export.F_Cu, export.B_Cu]]
+    assert gerberPlotLayers(fakeBoard(4), plan, exportSettingsJlcpcb) == plan
+
+def test_plotGerberLayersParallel(monkeypatch):
+    plotted = []
+    patchPlotting(monkeypatch, plotted)
+    layers = gerberPlotLayers(fakeBoard(4), fullGerberPlotPlan, exportSettingsJlcpcb)
+    serial = plotGerberLayers(FakePlotController("out", []), layers)
+    assert serial == [(id, f"board-{suffix}.gbr") for suffix, id, _ in layers]
+    for workers in [2, 3, len(layers), len(layers) + 5]:
+        plotted.clear()
+        concurrent = []
+        files = plotGerberLayersParallel("board.kicad_pcb", "out", layers,
+            exportSettingsJlcpcb, workers, concurrently=lambda: concurrent.append(True))
+        assert files == serial
+        assert sorted(plotted) == sorted(id for _, id, _ in layers)
+        assert concurrent == [True]
+
+def test_gerberImplParallelOutputDir(monkeypatch, tmp_path):
+    plotted = []
+    patchPlotting(monkeypatch, plotted)
+    outputs = {}
+    class FakeDrillWriter:
+        def __init__(self, board): pass
+        def __getattr__(self, name): return lambda *args: None
+        def CreateDrillandMapFilesSet(self, directory, drill, map):
+            outputs["drill"] = directory
+        def GenDrillReportFile(self, filename):
+            outputs["report"] = filename
+    class FakeJobFileWriter:
+        def __init__(self, board): self.files = []
+        def AddGbrFile(self, id, filename): self.files.append((id, filename))
+        def CreateJobFile(self, filename):
+            outputs["job"] = filename
+            outputs["jobFiles"] = self.files
+    monkeypatch.setattr(export, "EXCELLON_WRITER", FakeDrillWriter)
+    monkeypatch.setattr(export, "GERBER_JOBFILE_WRITER", FakeJobFileWriter)
+
+    outputDir = tmp_path / "gerbers"
+    export.gerberImpl("board.kicad_pcb", str(outputDir), workers=3)
+    assert outputDir.is_dir()
+    assert outputs["drill"] == os.path.join(str(outputDir), "")
+    assert outputs["report"] == str(outputDir / "drill_report.rpt")
+    assert outputs["job"] == str(outputDir / "board.gbrjob")
+    layers = gerberPlotLayers(fakeBoard(4), fullGerberPlotPlan, exportSettingsJlcpcb)
+    assert outputs["jobFiles"] == [(id, f"board-{suffix}.gbr") for suffix, id, _ in layers]
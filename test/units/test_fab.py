@@ -0,0 +1,30 @@
+import re
+from kikit.fab.common import CorrectionMatcher, CorrectionPattern
+
+def pattern(footprint, correction):
+    return CorrectionPattern(re.compile(footprint), re.compile(".*"), *correction)
+
+def test_correctionMatcher():
+    patterns = [
+        pattern("Resistor_SMD:R_0402", (1, 2, 90)),
+        pattern(".*:SOT-23", (0, 0, 180)),
+        pattern("Resistor_SMD:", (3, 4, 0)),
+    ]
+    matcher = CorrectionMatcher(patterns)
+    assert matcher.combined is not None
+    assert matcher.match("Resistor_SMD:R_0402_1005Metric") == (1, 2, 90)
+    assert matcher.match("Resistor_SMD:R_0603_1608Metric") == (3, 4, 0)
+    assert matcher.match("Package_TO_SOT_SMD:SOT-23") == (0, 0, 180)
+    assert matcher.match("Capacitor_SMD:C_0402_1005Metric") == (0, 0, 0)
+
+    # Patterns with groups are matched one by one
+    patterns.insert(0, pattern("(Cap)acitor_SMD:C_(\\d+)", (5, 6, 270)))
+    matcher = CorrectionMatcher(patterns)
+    assert matcher.combined is None
+    assert matcher.match("Capacitor_SMD:C_0402_1005Metric") == (5, 6, 270)
+    assert matcher.match("Resistor_SMD:R_0402_1005Metric") == (1, 2, 90)
+
+def test_correctionMatcherWithoutPatterns():
+    matcher = CorrectionMatcher([])
+    assert matcher.combined is None
+    assert matcher.match("Resistor_SMD:R_0402_1005Metric") == (0, 0, 0)
@@ -1,4 +1,5 @@
 import pytest
+import random
 from kikit.intervals import *
 
 def identity(x):
@@ -119,6 +120,42 @@ def test_boxNeighborsNotSameLevel():
     assert n.bottom(2) == [4]
     assert n.bottom(1) == [3]
 
+def naiveNeighbors(list):
+    """
+    Reference implementation comparing each box with all the farther ones
+    """
+    neighbors = {}
+    for i, (ident, interval, pos) in enumerate(list):
+        n = []
+        rest = IntervalList([interval])
+        for nIdent, nInterval, nPos in list[i + 1:]:
+            shadow = rest.intersect(nInterval)
+            if shadow.trivial():
+                continue
+            n.append((nIdent, shadow))
+            rest = rest.difference(nInterval)
+            if rest.trivial():
+                break
+        neighbors[ident] = n
+    return neighbors
+
+def test_boxNeighborsRandom():
+    random.seed(42)
+    boxes = {}
+    for i in range(20):
+        for j in range(20):
+            if random.random() < 0.3:
+                continue
+            x, y = 10 * i + random.randint(0, 3), 10 * j + random.randint(0, 3)
+            w, h = random.randint(1, 6), random.randint(1, 6)
+            boxes[len(boxes)] = (x, y, x + w, y + h)
+    yProj = lambda b: Interval(b[1], b[3])
+    xProj = lambda b: Interval(b[0], b[2])
+    for proj, dist in [(yProj, lambda b: -b[2]), (yProj, lambda b: b[0]),
+                       (xProj, lambda b: -b[3]), (xProj, lambda b: b[1])]:
+        list = BoxNeighbors._prepareProjection(proj, dist, boxes)
+        assert BoxNeighbors._computeQuery(list) == naiveNeighbors(list)
+
 def test_bounds():
     a = [1, 2, 3, 4, 5, 6, 7, 8]
     b = [2, 4, 6, 8, 10, 12, 14]
@@ -175,6 +212,47 @@ def test_trimShadows():
         SL(lines[0].line, I(1, 4)), SL(lines[1].line, I(1, 3))
     ]
 
+def test_indexSet():
+    s = IndexSet(10)
+    assert s.next(0) is None
+    assert s.previous(9) is None
+    s.add(3)
+    s.add(7)
+    assert s.next(0) == 3
+    assert s.next(3) == 3
+    assert s.next(4) == 7
+    assert s.next(8) is None
+    assert s.previous(9) == 7
+    assert s.previous(6) == 3
+    assert s.previous(2) is None
+    s.remove(3)
+    assert s.next(0) == 7
+    assert s.previous(6) is None
+
+def test_findCrossings():
+    AL = AxialLine
+    bounds = [AL(0, 0, 3), AL(1, 1, 2), AL(3, 2, 3), AL(4, 0, 2)]
+    y = [2, 2.5, 2.5, 0.5, 5]
+    start = [1, 1, 3, 1, 0]
+    forward = [True, True, False, False, True]
+    crossings = findCrossings(AxialLineSet.fromLines(bounds), y, start, forward)
+    assert crossings.tolist() == [1, 2, 2, 0, -1]
+
+def test_axialLineSet():
+    AL = AxialLine
+    a = AxialLineSet.fromLines([AL(1, 3, 2, "A"), AL(0, 0, 1), AL(1, 2, 3, "A")])
+    b = AxialLineSet.fromLines([AL(5, 0, 1, "B"), AL(4, 0, 1, "A")])
+    assert a.lines() == [AL(1, 2, 3, "A"), AL(0, 0, 1), AL(1, 2, 3, "A")]
+    assert a.line(0).tag == "A"
+    assert a.line(1).tag is None
+
+    c = AxialLineSet.concatenate([a, b])
+    assert len(c) == 5
+    assert [l.tag for l in c.lines()] == ["A", None, "A", "B", "A"]
+    assert c.unique().lines() == [AL(1, 2, 3), AL(0, 0, 1), AL(5, 0, 1), AL(4, 0, 1)]
+    assert [l.x for l in c.sortedByX().lines()] == [0, 1, 1, 4, 5]
+    assert c.withSpan(c.x, c.x + 1).line(3) == AL(5, 5, 6)
+
 def test_BoxPartitionLines():
     pass
     boxes = {
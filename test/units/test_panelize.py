@@ -10,3 +10,60 @@ def test_prolongCut():
 
     assert prolonged.coords[0] == pytest.approx((sqrt(2)/2 * -0.5, sqrt(2)/2 * -0.5))
     assert prolonged.coords[1] == pytest.approx((1 + sqrt(2)/2 * 0.5, 1 + sqrt(2)/2 * 0.5))
+
+def test_buildTabsParallelKeepsRevertTransformation():
+    from types import SimpleNamespace
+    from shapely.geometry import box
+    from kikit.annotations import TabAnnotation
+    from kikit.panelize import Panel, buildTabs, isPicklable
+    from kikit.substrate import Substrate
+    from kikit.transformation import AffineTransformation
+
+    def makeSubstrate(x, revert):
+        s = Substrate([], revertTransformation=revert)
+        s.substrates = box(x, 0, x + 10, 10)
+        s.partitionLine = LineString([(x - 5, -2), (x + 15, -2)])
+        s.annotations = [TabAnnotation(None, (x + 5, -1), (0, 1), 2)]
+        return s
+
+    local = lambda p: (p[0] + 1000, p[1] + 1000)
+    affine = AffineTransformation.translation((1000, 1000))
+    assert not isPicklable(local) and isPicklable(affine)
+    panel = SimpleNamespace(substrates=[
+        makeSubstrate(0, affine), makeSubstrate(20, local), makeSubstrate(40, None)])
+    parallel = Panel._buildTabsParallel(panel, 0, 2)
+    for s, (tabs, cuts) in zip(panel.substrates, parallel):
+        serialTabs, serialCuts = buildTabs(s, s.partitionLine, s.annotations, 0)
+        assert [t.equals(e) for t, e in zip(tabs, serialTabs)] == [True]
+        assert [c.equals(e) for c, e in zip(cuts, serialCuts)] == [True]
+
+    # Errors of the substrates built serially still report source coordinates
+    failing = makeSubstrate(60, local)
+    failing.annotations = [TabAnnotation(None, (65, -1), (0, -1), 2)]
+    panel.substrates.append(failing)
+    with pytest.raises(RuntimeError, match="in source board"):
+        Panel._buildTabsParallel(panel, 0, 2)
+
+def test_saveKeepsBoard(tmp_path):
+    from kikit.common import fromMm, toKiCADPoint
+    from kikit.defs import Layer
+    from kikit.panelize import Panel
+
+    panel = Panel(str(tmp_path / "panel.kicad_pcb"))
+    for x in [0, 40]:
+        panel.appendBoard("../resources/conn.kicad_pcb", toKiCADPoint((fromMm(x), 0)))
+    panel.addVCutV(fromMm(20))
+    panel.vCutClearance = fromMm(0.5)
+    def boardState():
+        drawings = list(panel.board.GetDrawings())
+        return (len(drawings), len([d for d in drawings if d.GetLayer() == Layer.Edge_Cuts]),
+                len(panel.board.Zones()))
+    before = boardState()
+    outputs = []
+    for _ in range(2):
+        panel.save()
+        assert boardState() == before
+        with open(tmp_path / "panel.kicad_pcb") as f:
+            outputs.append(sorted(line.split("(tstamp")[0].split("(uuid")[0]
+                                  for line in f if "(gr_" in line))
+    assert outputs[0] == outputs[1]
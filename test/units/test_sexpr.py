@@ -1,4 +1,5 @@
 import pytest
+from io import BytesIO
 from kikit.sexpr import *
 
 def eval(s, truth):
@@ -41,3 +42,117 @@ def test_identiy():
     with open(SOURCE) as f:
         ast2 = parseSexprF(f, limit=3)
     assert str(ast2) == truth
+
+def test_locateTopLevelNode():
+    SOURCE = b'(root (a "(paper \\" x)") (paper "A4") (b (paper "A3")))'
+    for blockSize in [1, 3, 1 << 16]:
+        span = locateTopLevelNode(BytesIO(SOURCE), ["paper"], blockSize=blockSize)
+        assert SOURCE[span[0]:span[1]] == b'(paper "A4")'
+    assert locateTopLevelNode(BytesIO(SOURCE), ["paper"], limit=1) is None
+    assert locateTopLevelNode(BytesIO(SOURCE), ["c"]) is None
+
+def test_replaceTopLevelNode(tmp_path):
+    SOURCE = '(root (a "x")\n  (paper "A4")\n  (b (c d))\n)'
+    filename = str(tmp_path / "board.kicad_pcb")
+    with open(filename, "w") as f:
+        f.write(SOURCE)
+
+    assert str(readTopLevelNode(filename, ["paper"])) == '(paper "A4")'
+
+    replaceTopLevelNode(filename, ["paper"], '(paper "A3")')
+    with open(filename) as f:
+        assert f.read() == SOURCE.replace("A4", "A3")
+
+    size = replaceTopLevelNode(filename, ["paper"], '(paper "User" 100 200)')
+    with open(filename) as f:
+        content = f.read()
+    assert content == SOURCE.replace('"A4"', '"User" 100 200')
+    assert size == len(content)
+
+    with pytest.raises(ParseError):
+        replaceTopLevelNode(filename, ["page"], '(page "A4")')
+
+def test_replaceTopLevelNodeKeepsFile(tmp_path, monkeypatch):
+    import os, shutil
+    filename = str(tmp_path / "board.kicad_pcb")
+    with open(filename, "w") as f:
+        f.write('(root\n  (paper "A4")\n  (b (c d))\n)')
+    os.chmod(filename, 0o640)
+    replaceTopLevelNode(filename, ["paper"], '(paper "User" 100 200)')
+    assert os.stat(filename).st_mode & 0o777 == 0o640
+
+    def fail(*args):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(shutil, "copyfileobj", fail)
+    with pytest.raises(OSError):
+        replaceTopLevelNode(filename, ["paper"], '(paper "A3")')
+    assert os.listdir(tmp_path) == ["board.kicad_pcb"]
+    with open(filename) as f:
+        assert '(paper "User" 100 200)' in f.read()
+
+def test_tokenizerMatchesStreamParser():
+    def streamParse(source, limit):
+        stream = Stream(StringIO(source))
+        lw = readWhitespace(stream)
+        s = readSexpr(stream, limit=limit)
+        s.leadingWhitespace = lw
+        s.trailingOuterWhitespace = readWhitespace(stream)
+        return s
+
+    with open("../resources/conn.kicad_pcb") as f:
+        board = f.read()
+    for source in [board, '(a "x\\"y" b"c (d))', '  (a)  \n', '(() ( ) "")']:
+        for limit in [None, 0, 1, 3]:
+            parsed = parseSexprS(source, limit=limit)
+            expected = streamParse(source, limit)
+            assert parsed == expected
+            assert parsed.trailingOuterWhitespace == expected.trailingOuterWhitespace
+            assert str(parsed) == source
+
+def test_parseErrors():
+    for source in ["", "a", "(a", '(a "b)']:
+        with pytest.raises(ParseError):
+            parseSexprS(source)
+
+def test_skipSexpr():
+    SOURCE = '(a (b ")(" c) "x\\")" d"e) f'
+    assert SOURCE[:skipSexpr(SOURCE, 0)] == SOURCE[:-2]
+    assert SOURCE[3:skipSexpr(SOURCE, 3)] == '(b ")(" c)'
+    with pytest.raises(ParseError):
+        skipSexpr("(a (b)", 0)
+
+def test_lazyParsing():
+    with open("../resources/conn.kicad_pcb") as f:
+        truth = f.read()
+    full = parseSexprS(truth)
+    lazy = parseSexprS(truth, lazy=True)
+    assert str(lazy) == truth
+
+    paper = findNode(lazy, "paper")
+    assert paper.name == "paper"
+    assert all(isinstance(x, LazySExpr) and not x.parsed
+               for x in lazy.items if isinstance(x, SExpr))
+    assert paper == findNode(full, "paper")
+    assert paper.parsed
+
+    assert lazy == full
+    assert str(lazy) == truth
+
+    limited = parseSexprS(truth, limit=3, lazy=True)
+    assert len(limited.items) == 3
+    assert str(limited) == truth
+
+def test_deepNesting():
+    SOURCE = "(a" * 5000 + " b" + ")" * 5000
+    parsed = parseSexprS(SOURCE)
+    assert str(parsed) == SOURCE
+    out = StringIO()
+    parsed.write(out)
+    assert out.getvalue() == SOURCE
+
+def test_sharedStrings():
+    parsed = parseSexprS("(a\n  (at 1 2)\n  (at 1 3))")
+    first, second = parsed[1], parsed[2]
+    assert first[0].value is second[0].value
+    assert first[1].value is second[1].value
+    assert first.leadingWhitespace is second.leadingWhitespace
@@ -1,5 +1,6 @@
 import pytest
 from shapely.geometry import Point
+from shapely.affinity import translate
 from kikit.substrate import *
 
 def test_biteBoundary():
@@ -21,3 +22,67 @@ def test_biteBoundary():
 
     t5 = biteBoundary(l1, Point(1, 0.25), Point(1, 0.75), 0.1)
     assert t5 == LineString([(1, 0.25), (1, 0.75)])
+
+def test_localTabFillet():
+    s = Substrate([])
+    board = box(0, 0, fromMm(100), fromMm(100))
+    for x in range(5, 100, 5):
+        for y in range(5, 100, 5):
+            board = board.difference(Point(fromMm(x), fromMm(y)).buffer(fromMm(1.5)))
+    s.union(board)
+    s.orient()
+
+    tab = box(fromMm(-5), fromMm(48.5), fromMm(0.001), fromMm(51.5))
+    face = LineString([(0, fromMm(51.5)), (0, fromMm(48.5))])
+    fillet = fromMm(1)
+    localTab, localFace = s._makeTabFillet(tab, face, fillet)
+    globalTab, globalFace = Substrate._computeTabFillet(s.substrates, tab, face, fillet)
+    assert localTab.symmetric_difference(globalTab).area < 1
+    assert localFace.hausdorff_distance(globalFace) < 1
+    assert localTab.area > tab.area
+
+def test_localMill():
+    boards = []
+    for x in range(0, 100, 10):
+        for y in range(0, 100, 10):
+            boards.append(box(fromMm(x), fromMm(y), fromMm(x + 9), fromMm(y + 9)))
+            boards.append(box(fromMm(x + 4), fromMm(y + 8), fromMm(x + 5), fromMm(y + 11)))
+    geometry = unary_union(boards)
+    radius = fromMm(1)
+    mill = lambda g: g.buffer(radius, resolution=8).buffer(-radius, resolution=8)
+    pieces = localMill(geometry, geometry.bounds, mill, radius, maxVertices=50)
+    assert len(pieces) > 1
+    local = unary_union(pieces)
+    expected = mill(geometry)
+    assert local.symmetric_difference(expected).area < fromMm(0.01) ** 2
+    assert local.area > geometry.area
+
+def assertMillMatchesWholeShape(geometry, radius):
+    s = Substrate([])
+    s.union(geometry)
+    s.orient()
+    expected = Substrate._computeMill(s.substrates, radius)
+    s.millFillets(radius, maxVertices=200)
+    assert len(listGeometries(s.substrates)) == len(listGeometries(expected))
+    assert s.substrates.symmetric_difference(expected).area < fromMm(0.001) ** 2
+
+def test_millFilletsMatchesWholeShape():
+    boards = []
+    for x in range(0, 100, 10):
+        for y in range(0, 100, 10):
+            boards.append(Point(fromMm(x + 4.5), fromMm(y + 4.5)).buffer(fromMm(4.5))
+                .difference(box(fromMm(x + 3), fromMm(y + 3), fromMm(x + 6), fromMm(y + 6))))
+            boards.append(box(fromMm(x + 4), fromMm(y + 8), fromMm(x + 5), fromMm(y + 11)))
+            boards.append(box(fromMm(x + 8.5), fromMm(y + 4), fromMm(x + 10.5), fromMm(y + 5)))
+    assertMillMatchesWholeShape(unary_union(boards), fromMm(1))
+
+@pytest.mark.parametrize("resource", ["conn.kicad_pcb", "multiboard.kicad_pcb"])
+def test_millFilletsMatchesWholeShapeOnResources(resource):
+    board = pcbnew.LoadBoard(f"../resources/{resource}")
+    source = Substrate(collectEdges(board, Layer.Edge_Cuts)).substrates
+    minx, miny, maxx, maxy = source.bounds
+    # Replicate the boards into a panel with narrow gaps between them
+    gap = fromMm(1.5)
+    panel = unary_union([translate(source, i * (maxx - minx + gap), j * (maxy - miny + gap))
+                         for i in range(4) for j in range(4)])
+    assertMillMatchesWholeShape(panel, fromMm(1))
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+from kikit.transformation import *
+
+def test_rotation():
+    # KiCAD rotates counter-clockwise on screen (y axis points down)
+    r = AffineTransformation.rotation(90, (10, 10))
+    assert r((20, 10)) == (10, 0)
+    assert r((10, 20)) == (20, 10)
+    assert AffineTransformation.rotation(-90)((1, 0)) == (0, 1)
+    assert AffineTransformation.rotation(450)((1, 0)) == (0, -1)
+    # Non-right angles are rounded half away from zero
+    assert AffineTransformation.rotation(45)((1000, 0)) == (707, -707)
+    assert AffineTransformation.rotation(45)((-1000, 0)) == (-707, 707)
+
+def test_truncation():
+    r = AffineTransformation.rotation(0)
+    assert r((1.9, -1.9)) == (1, -1)
+    t = AffineTransformation.translation((0.5, 0.5))
+    assert t((1, 1)) == (1.5, 1.5)
+
+def test_composition():
+    t = AffineTransformation.translation((1, 2)) \
+        .then(AffineTransformation.translation((3, 4)))
+    assert len(t.steps) == 1
+    assert t((0, 0)) == (4, 6)
+
+    p = AffineTransformation.rotation(90, (5, 5)) \
+        .then(AffineTransformation.translation((100, 0)))
+    assert p((10, 5)) == (105, 0)
+    assert p.inverse()((105, 0)) == (10, 5)
+
+def test_batch():
+    t = AffineTransformation.rotation(37, (123, -45)) \
+        .then(AffineTransformation.translation((1000, 2000)))
+    points = np.array([[0, 0], [1000, 5], [-300, 7000], [12, 12]])
+    batch = t.apply(points)
+    assert batch.shape == (4, 2)
+    for point, transformed in zip(points, batch):
+        assert t(point) == tuple(transformed)
+
+def test_revertTruncatesFirst():
+    # Reverting a placement truncates the point (like VECTOR2I(int(x), int(y)))
+    # before undoing the translation, which differs from truncating afterwards
+    # when the sign changes
+    place = AffineTransformation.rotation(0) \
+        .then(AffineTransformation.translation((1, 1)))
+    revert = AffineTransformation.truncation().then(place.inverse())
+    assert revert((0.5, -0.5)) == (-1, -1)
+    assert place.inverse()((0.5, -0.5)) == (0, -1)
+    assert revert((1.5, 1.5)) == (0, 0)
+
+    place = AffineTransformation.rotation(30, (7, -3)) \
+        .then(AffineTransformation.translation((1000, -2000)))
+    revert = AffineTransformation.truncation().then(place.inverse())
+    for x, y in [(999.7, -2000.2), (-12.5, 0.5), (1234.9, -5678.9)]:
+        expected = AffineTransformation.rotation(-30, (7, -3))(
+            (int(x) - 1000, int(y) + 2000))
+        assert revert((x, y)) == expected